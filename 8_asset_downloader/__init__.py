@@ -34,9 +34,11 @@ category = None
 downloadView = None
 
 def load(app):
+    global downloadView
     category = app.getCategory('Community')
     downloadView = category.addTask(AssetDownloadTaskView(category))
 
 def unload(app):
-    pass
+    if downloadView is not None:
+        downloadView.shutdown()
 
@@ -31,18 +31,38 @@ import platform
 import calendar
 import sys
 import datetime
-import shutil
+import hashlib
+import pickle
+import time
 
-from zipfile import ZipFile
 from progress import Progress
 
 from core import G
 
-from .remoteasset import RemoteAsset
+from .remoteasset import RemoteAsset, getAssetType
 from .downloadtask import DownloadTask
+from .connectionpool import getConnectionPool
+from .fileutil import replaceFile
+from .extracttask import ExtractTask
+from .textindex import TextIndex
+from .assetstore import AssetStore
+from .assetwatcher import LocalAssetWatcher
+from .thumbnailqueue import ThumbnailQueue
+from .thumbpack import ThumbnailPack
+from .screenshotconverter import ConvertTask
 
 mhapi = gui3d.app.mhapi
 
+# Bump this whenever the layout of the remote DB snapshot changes
+SNAPSHOT_VERSION = 3
+
+# Max number of assets in a filtered result to fetch missing thumbnails for
+MAX_REQUESTED_THUMBNAILS = 500
+
+# Directory listings read less than this many seconds after the directory changed are not trusted
+# later on, since file systems with coarse timestamps give a change in the same second the same mtime
+DIR_CACHE_RACY_SECONDS = 2.0
+
 class AssetDB():
 
     def __init__(self, parent):
@@ -50,33 +70,282 @@ class AssetDB():
         self.knownClothesCategories = []
         self.knownAuthors = []
         self.assetsById = dict()
+        self.lastSyncChanges = None
         self.isSynchronized = False
         self.parent = parent
         self.root = mhapi.locations.getUserDataPath("community-assets")
         self.remotecache = os.path.join(self.root,"remotecache")
         self.remotedb = os.path.join(self.root,"remote.json")
+        self.snapshot = os.path.join(self.root,"remote.snapshot")
         self.thumbseed = os.path.join(self.root, "asset-db-thumbnails.zip")
         self.screenseed = os.path.join(self.root, "asset-db-screenshots.zip")
         self.localdb = os.path.join(self.root,"local.json")
+        self.storedb = os.path.join(self.root,"assets.sqlite")
+        self.thumbpackPath = os.path.join(self.root,"thumbnails.pack")
         self.log = mhapi.utility.getLogChannel("assetdownload")
 
+        self._store = None
+        self._installLocations = None
+        self.syncTypes = None
+        self.loadedSyncTypes = None
+        self.thumbnailQueue = None
+        self.thumbpack = None
+        self.watcher = None
+
         self.localJson = None
 
         self.localAssets = {}
 
-        self._loadRemoteDB()
+        self.downloadedIds = {}
+        self.titleIndex = TextIndex()
+        self.descIndex = TextIndex()
 
         if os.path.exists(self.localdb):
+            self._migrateLocalJson()
+
+        # The catalog is loaded with the scope of the last sync. A scope chosen since then only
+        # takes effect when the next sync has finished.
+        self.syncTypes = self._readSyncTypes("syncTypes", None)
+
+        self._loadRemoteDB(self._readSyncTypes("syncedTypes", self.syncTypes))
+
+        if os.path.exists(self.storedb) and self._getStore().hasLocalAssets():
             self._loadLocalDB()
         else:
             if self.isSynchronized:
                 self._rebuildLocalDB()
                 self._loadLocalDB()
 
-    def _loadRemoteDB(self):
+    def _getStore(self):
+        # The store is opened on first use, since creating the database file also creates
+        # the community-assets directory, which is how a first sync is detected
+        if self._store is None:
+            if not os.path.exists(self.root):
+                os.makedirs(self.root)
+            self._store = AssetStore(self.storedb)
+        return self._store
+
+    def _migrateLocalJson(self):
+        self.log.trace("Enter")
+
+        self.log.info("Migrating local json to asset store", self.localdb)
+
+        with open(self.localdb, "r") as f:
+            if mhapi.utility.isPython3():
+                localAssets = json.load(f)
+            else:
+                localAssets = json.load(f, "UTF-8")
+
+        self._getStore().replaceLocalAssets(localAssets)
+
+        os.rename(self.localdb, self.localdb + ".migrated")
+
+    def _readSyncTypes(self, key, default):
+        if not os.path.exists(self.storedb):
+            return default
+        syncTypes = self._getStore().getMeta(key)
+        if syncTypes is None:
+            return default
+        return json.loads(syncTypes)
+
+    def getSyncTypes(self):
+        """Return the list of asset types which are chosen to be synchronized, or None if all types are."""
+        if self.syncTypes is None:
+            return None
+        return list(self.syncTypes)
+
+    def setSyncTypes(self, syncTypes):
+        """Limit syncs, the local DB and the assets kept in memory to the given asset types. None means all types.
+        The change takes effect on the next sync."""
+        if syncTypes is not None:
+            syncTypes = sorted(set(syncTypes))
+        if self._getStore().getMeta("syncedTypes") is None:
+            # Stores from before the scope of the last sync was kept had only the chosen scope
+            self._getStore().setMeta("syncedTypes", json.dumps(self.loadedSyncTypes))
+        self.syncTypes = syncTypes
+        if syncTypes is None:
+            self._getStore().deleteMeta("syncTypes")
+        else:
+            self._getStore().setMeta("syncTypes", json.dumps(syncTypes))
+
+    def isLazyThumbnails(self):
+        """Return True if thumbnails are fetched when assets are listed, rather than during sync."""
+        if not os.path.exists(self.storedb):
+            return False
+        return self._getStore().getMeta("lazyThumbnails") == "1"
+
+    def setLazyThumbnails(self, lazy):
+        self._getStore().setMeta("lazyThumbnails", "1" if lazy else "0")
+
+    def getPixmapCacheMegabytes(self, default):
+        """Return the memory budget for decoded thumbnails and screenshots, in megabytes."""
+        if not os.path.exists(self.storedb):
+            return default
+        return int(self._getStore().getMeta("pixmapCacheMegabytes", default))
+
+    def setPixmapCacheMegabytes(self, megabytes):
+        self._getStore().setMeta("pixmapCacheMegabytes", str(int(megabytes)))
+
+    def isWatchingLocalAssets(self):
+        """Return True if the local DB follows changes made to the asset directories outside of the downloader."""
+        if not os.path.exists(self.storedb):
+            return True
+        return self._getStore().getMeta("watchLocalAssets", "1") == "1"
+
+    def setWatchingLocalAssets(self, watching):
+        self._getStore().setMeta("watchLocalAssets", "1" if watching else "0")
+        if watching:
+            self.startWatching()
+        else:
+            self.stopWatching()
+
+    def close(self):
+        """Stop the background threads and release the files and connections held by the DB."""
+        self.log.trace("Enter")
+
+        self.stopWatching()
+        if self.thumbnailQueue is not None:
+            self.thumbnailQueue.stop()
+            self.thumbnailQueue.pack = None
+        if self.thumbpack is not None:
+            self.thumbpack.close()
+            self.thumbpack = None
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        getConnectionPool().closeAll()
+
+    def getThumbnailQueue(self):
+        if self.thumbnailQueue is None:
+            self.thumbnailQueue = ThumbnailQueue()
+            self.thumbnailQueue.pack = self.getThumbnailPack()
+        return self.thumbnailQueue
+
+    def isPackedThumbnails(self):
+        """Return True if thumbnails are kept in a single pack file rather than one file per asset."""
+        if not os.path.exists(self.storedb):
+            return False
+        return self._getStore().getMeta("packedThumbnails") == "1"
+
+    def setPackedThumbnails(self, packed):
+        """Move all thumbnails into the pack file, or back out of it into one file per asset."""
+        if packed == self.isPackedThumbnails():
+            return
+
+        self._getStore().setMeta("packedThumbnails", "1" if packed else "0")
+
+        queue = self.getThumbnailQueue()
+        if packed:
+            queue.pack = self.getThumbnailPack()
+            self._packThumbnails()
+        else:
+            queue.pack = None
+            self._unpackThumbnails()
+
+    def getThumbnailPack(self):
+        """Return the thumbnail pack, or None if thumbnails are not packed."""
+        if self.thumbpack is None and self.isPackedThumbnails():
+            self.thumbpack = ThumbnailPack(self.thumbpackPath, self._getStore())
+        return self.thumbpack
+
+    def _packThumbnails(self):
+        """Move the thumbnail files into the pack. The files are only listed here, they are read and
+        removed on a worker thread of the thumbnail queue."""
+
+        self.log.trace("Enter")
+
+        existingFiles = self.getCachedFiles()
+
+        files = {}
+        for assetId in self.assetsById:
+            thumbPath = self.assetsById[assetId].getThumbPath()
+            # A file on disk is always newer than the packed copy, since files are removed
+            # once they have been packed
+            if thumbPath is not None and thumbPath in existingFiles:
+                files[assetId] = thumbPath
+
+        self.getThumbnailQueue().packFiles(files)
+
+    def _unpackThumbnails(self):
+        self.log.trace("Enter")
+
+        pack = self.thumbpack
+        if pack is None:
+            pack = ThumbnailPack(self.thumbpackPath, self._getStore())
+        for assetId in pack.getIds():
+            if assetId in self.assetsById:
+                thumbPath = self.assetsById[assetId].getThumbPath()
+                dn = os.path.dirname(thumbPath)
+                if not os.path.exists(dn):
+                    os.makedirs(dn)
+                with open(thumbPath, "wb") as f:
+                    f.write(pack.get(assetId))
+        pack.remove(pack.getIds())
+        # The pack has to be unmapped before the file can be removed on windows
+        pack.close()
+        self.thumbpack = None
+        os.remove(self.thumbpackPath)
+
+    def compactThumbnails(self):
+        """Reclaim the space used by replaced and removed thumbnails in the pack. Returns the number of bytes reclaimed."""
+        pack = self.getThumbnailPack()
+        if pack is None:
+            return 0
+        return pack.compact()
+
+    def getThumbData(self, asset):
+        """Return the contents of the thumbnail of the given asset, from the pack if thumbnails are packed,
+        or None if the asset does not have a thumbnail yet."""
+        pack = self.getThumbnailPack()
+        if pack is not None:
+            data = pack.get(asset.getId())
+            if data is not None:
+                return data
+
+        thumbPath = asset.getThumbPath()
+        if thumbPath is None or not os.path.exists(thumbPath):
+            return None
+        with open(thumbPath, "rb") as f:
+            return f.read()
+
+    def requestThumbnails(self, assets):
+        """Fetch the missing thumbnails of the given assets in the background, in the given order.
+        Thumbnails requested earlier which are not fetched yet are dropped."""
+        self.getThumbnailQueue().request(assets[:MAX_REQUESTED_THUMBNAILS])
+
+    def requestVisibleThumbnail(self, asset):
+        """Fetch the missing thumbnail of an asset which is on screen, unless the shown assets change first."""
+        self.getThumbnailQueue().requestVisible(asset)
+
+    def requestThumbnailNow(self, asset):
+        self.getThumbnailQueue().requestNow(asset)
+
+    def cancelThumbnailRequests(self):
+        """Drop the thumbnails requested for the assets shown so far, as they are no longer shown."""
+        if self.thumbnailQueue is not None:
+            self.thumbnailQueue.cancel()
+
+    def _invalidateThumbnails(self, assetIds):
+        """Forget the thumbnails of the given assets, so that the current ones are fetched when the assets are shown."""
+        pack = self.getThumbnailPack()
+        if pack is not None:
+            pack.remove(assetIds)
+        for assetId in assetIds:
+            thumbPath = self.assetsById[assetId].getThumbPath() if assetId in self.assetsById else None
+            if thumbPath is not None and os.path.exists(thumbPath):
+                os.remove(thumbPath)
+
+    def _isInScope(self, assetType):
+        return self.loadedSyncTypes is None or assetType in self.loadedSyncTypes
+
+    def _loadRemoteDB(self, syncTypes, previousAssets=None, previousTypes=None):
+        """Load the catalog, limited to the given list of asset types, or all types if it is None."""
+
         self.log.trace("Enter")
 
         self.remoteAssets = {}
+        self._installLocations = None
+        self.loadedSyncTypes = None if syncTypes is None else list(syncTypes)
         for key in mhapi.assets.getAssetTypes():
             if key != "node_setups_and_blender_specific":
                 self.remoteAssets[key] = {}
@@ -87,18 +356,64 @@ class AssetDB():
             self.log.warn("Remote json does not exist locally")
             return
 
-        with open(self.remotedb,"r") as f:
-            if mhapi.utility.isPython3():
-                self.remoteJson = json.load(f)
-            else:
-                self.remoteJson = json.load(f,"UTF-8")
+        startTime = time.time()
+
+        with open(self.remotedb,"rb") as f:
+            rawData = f.read()
+
+        # The snapshot only contains the types in the sync scope, so the scope is part of
+        # what it was made from
+        sourceHash = hashlib.sha1(rawData)
+        sourceHash.update(json.dumps(self.loadedSyncTypes).encode("UTF-8"))
+        sourceHash = sourceHash.hexdigest()
+
+        if self._loadSnapshot(sourceHash):
+            if previousAssets is not None:
+                # The catalog is byte for byte the one the snapshot was made from
+                self.lastSyncChanges = { "added": [], "changed": [], "removed": [] }
+            self.isSynchronized = True
+            self._storeRemoteDB(sourceHash)
+            self.log.debug("Remote DB loaded from snapshot, seconds:", time.time() - startTime)
+            return
+
+        self.remoteJson = json.loads(rawData.decode("UTF-8"))
+        rawData = None
 
         self.log.spam("remoteJson",self.remoteJson)
 
-        for assetId in self.remoteJson.keys():
+        # A re-sync may have dropped categories, so they are collected from scratch
+        self.knownClothesCategories = []
+
+        # When there is a previous catalog, assets with the same nid and change date are
+        # reused as they are, so that only new and changed assets are parsed again
+        added = []
+        changed = []
+        seen = set()
+
+        keys = list(self.remoteJson.keys())
+        if self.loadedSyncTypes is not None:
+            keys = [key for key in keys if self._isInScope(getAssetType(self.remoteJson[key]))]
+            self._addMaterialTargets(keys)
+            self.log.debug("Number of assets in sync scope", len(keys))
+
+        for assetId in keys:
             rawAsset = self.remoteJson[assetId]
-            asset = RemoteAsset(self,rawAsset,assetdb=self)
+            previousAsset = None
+            if previousAssets is not None:
+                previousAsset = previousAssets.get(rawAsset.get("nid"))
+
+            if previousAsset is not None and previousAsset.changed == rawAsset.get("changed") and not self._dependsOnOtherAsset(rawAsset):
+                asset = previousAsset
+            else:
+                asset = RemoteAsset(self,rawAsset,assetdb=self)
+                if previousAssets is not None:
+                    if previousAsset is None:
+                        if previousTypes is None or asset.getType() in previousTypes:
+                            added.append(asset.getId())
+                    elif previousAsset.changed != asset.changed:
+                        changed.append(asset.getId())
             assetType = asset.getType()
+            seen.add(asset.getId())
 
             self.log.trace("assetId",assetId)
             self.log.trace("assetType", assetType)
@@ -120,6 +435,20 @@ class AssetDB():
                     self.remoteAssets[assetType][assetId] = asset
                     self.assetsById[assetId] = asset
 
+        for assetId in list(self.assetsById.keys()):
+            if assetId not in seen:
+                del self.assetsById[assetId]
+
+        if previousAssets is not None:
+            # Assets which were only dropped from the sync scope are not reported as removed
+            remoteIds = set([self.remoteJson[key].get("nid") for key in self.remoteJson])
+            removed = sorted([assetId for assetId in previousAssets if assetId not in remoteIds])
+            self.lastSyncChanges = { "added": sorted(added), "changed": sorted(changed), "removed": removed }
+            self.log.debug("Number of added assets", len(added))
+            self.log.debug("Number of changed assets", len(changed))
+            self.log.debug("Removed assets", removed)
+
+        self.knownAuthors = []
         for assetType in self.remoteAssets:
             for assetId in self.remoteAssets[assetType]:
                 author = self.remoteAssets[assetType][assetId].getAuthor()
@@ -130,77 +459,360 @@ class AssetDB():
 
         self.isSynchronized = True
 
-    def _loadLocalDB(self):
+        self._buildTextIndex()
+
+        self.log.debug("Remote DB parsed from json, seconds:", time.time() - startTime)
+
+        self._writeSnapshot(sourceHash)
+        self._storeRemoteDB(sourceHash)
+
+    def _addMaterialTargets(self, keys):
+        # Materials which belong to another asset are installed next to it, so assets outside
+        # of the sync scope which are the target of a material in scope are parsed too. They are
+        # only kept in assetsById until the materials have been resolved.
+        byNid = {}
+        for key in self.remoteJson:
+            byNid[self.remoteJson[key].get("nid")] = self.remoteJson[key]
+
+        for key in keys:
+            belongsTo = self.remoteJson[key].get("belongs_to")
+            if not isinstance(belongsTo, dict) or "belongs_to_id" not in belongsTo:
+                continue
+            targetId = belongsTo["belongs_to_id"]
+            if targetId in byNid and targetId not in self.assetsById and not self._isInScope(getAssetType(byNid[targetId])):
+                self.assetsById[targetId] = RemoteAsset(self,byNid[targetId],assetdb=self)
+
+    def _dependsOnOtherAsset(self, rawAsset):
+        # The install path of a material which belongs to another asset is taken from that
+        # asset, so it has to be resolved again even if the material itself is unchanged
+        belongsTo = rawAsset.get("belongs_to")
+        return isinstance(belongsTo, dict) and "belongs_to_id" in belongsTo
+
+    def getLastSyncChanges(self):
+        """Return a dict with the lists of ids of the assets which were added, changed and removed by the
+        last sync, or None if no sync has been made since the DB was loaded."""
+        return self.lastSyncChanges
+
+    def _storeRemoteDB(self, sourceHash):
+        # Filtering by type, author, license, category and date is done by SQLite, so the
+        # catalog is copied into the store whenever it is not the one stored already
+        store = self._getStore()
+        if store.getMeta("remoteHash") != sourceHash:
+            remoteAssets = []
+            for assetType in self.remoteAssets:
+                remoteAssets.extend(self.remoteAssets[assetType].values())
+            store.replaceRemoteAssets(remoteAssets, sourceHash)
+
+    def _buildTextIndex(self):
         self.log.trace("Enter")
 
-        self.log.debug("About to load local json from", self.localdb)
+        self.titleIndex = TextIndex()
+        self.descIndex = TextIndex()
 
-        if not os.path.exists(self.localdb):
-            self.log.warn("Local json does not exist")
+        for assetId in self.assetsById:
+            asset = self.assetsById[assetId]
+            self.titleIndex.addDocument(assetId, asset.title)
+            self.descIndex.addDocument(assetId, asset.description)
 
-            self.localAssets = {}
-            for key in mhapi.assets.getAssetTypes():
-                self.localAssets[key] = {}
+        self.titleIndex.finish()
+        self.descIndex.finish()
+
+    def _buildDownloadedIndex(self):
+        self.downloadedIds = {}
+        for assetType in self.localAssets:
+            self.downloadedIds[assetType] = set([int(assetId) for assetId in self.localAssets[assetType]])
+
+    def _loadSnapshot(self, sourceHash):
+        self.log.trace("Enter")
+
+        if not os.path.exists(self.snapshot):
+            self.log.debug("No remote DB snapshot")
+            return False
+
+        try:
+            with open(self.snapshot,"rb") as f:
+                snapshot = pickle.load(f)
+        except:
+            self.log.warn("Could not read remote DB snapshot", sys.exc_info())
+            return False
+
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("sourceHash") != sourceHash:
+            self.log.debug("Remote DB snapshot is outdated")
+            return False
+
+        if snapshot.get("userDataPath") != mhapi.locations.getUserDataPath():
+            self.log.debug("Remote DB snapshot was made for another user data path")
+            return False
+
+        for assetSnapshot in snapshot["assets"]:
+            asset = RemoteAsset.fromSnapshot(self, assetSnapshot, assetdb=self)
+            assetType = asset.getType()
+            if assetType in self.remoteAssets:
+                self.remoteAssets[assetType][asset.nid] = asset
+                self.assetsById[asset.nid] = asset
+
+        self.knownAuthors = snapshot["knownAuthors"]
+        self.knownClothesCategories = snapshot["knownClothesCategories"]
 
+        self.titleIndex = TextIndex.fromState(snapshot["titleIndex"])
+        self.descIndex = TextIndex.fromState(snapshot["descIndex"])
+
+        self.log.debug("Loaded remote DB snapshot with number of assets", len(self.assetsById))
+        return True
+
+    def _writeSnapshot(self, sourceHash):
+        self.log.trace("Enter")
+
+        snapshot = {}
+        snapshot["version"] = SNAPSHOT_VERSION
+        snapshot["sourceHash"] = sourceHash
+        snapshot["userDataPath"] = mhapi.locations.getUserDataPath()
+        snapshot["knownAuthors"] = self.knownAuthors
+        snapshot["knownClothesCategories"] = self.knownClothesCategories
+        snapshot["titleIndex"] = self.titleIndex.getState()
+        snapshot["descIndex"] = self.descIndex.getState()
+        snapshot["assets"] = []
+
+        for assetType in self.remoteAssets:
+            for assetId in self.remoteAssets[assetType]:
+                snapshot["assets"].append(self.remoteAssets[assetType][assetId].getSnapshot())
+
+        tmp = self.snapshot + ".tmp"
+        try:
+            with open(tmp,"wb") as f:
+                pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+            replaceFile(tmp, self.snapshot)
+        except:
+            self.log.warn("Could not write remote DB snapshot", sys.exc_info())
+
+    def _loadLocalDB(self):
+        self.log.trace("Enter")
+
+        self.log.debug("About to load local asset state from", self.storedb)
+
+        self.localAssets = {}
+        for key in mhapi.assets.getAssetTypes():
+            self.localAssets[key] = {}
+
+        if not os.path.exists(self.storedb):
+            self.log.warn("Asset store does not exist")
+            self._buildDownloadedIndex()
             return
 
-        with open(self.localdb, "r") as f:
-            if mhapi.utility.isPython3():
-                self.localAssets = json.load(f)
-            else:
-                self.localAssets = json.load(f, "UTF-8")
+        self.localAssets.update(self._getStore().getLocalAssets())
 
         self.log.spam("localAssets",self.localAssets)
 
+        self._buildDownloadedIndex()
+
     def _rebuildLocalDB(self):
         self.log.trace("Enter")
 
         self.log.debug("About to rebuild local DB")
+        startTime = time.time()
+
         self.localAssets = {}
         for key in mhapi.assets.getAssetTypes():
             if key != "node_setups_and_blender_specific":
                 self.localAssets[key] = {}
 
-        for assetType in self.remoteAssets.keys():
-            for assetId in self.remoteAssets[assetType].keys():
-                asset = self.remoteAssets[assetType][assetId]
-                self.log.spam("asset",asset)
-                location = asset.getInstallPath()
-                self.log.trace("asset location", location)
-                if os.path.exists(location):
-                    fn = asset.getPertinentFileName()
-                    self.log.trace("Pertinent file name", fn)
-                    if fn is not None:
-                        fn = os.path.join(location,fn)
-                        if os.path.exists(fn):
-                            self.log.trace("Installed asset location", location)
-                            self.localAssets[assetType][assetId] = {}
-                            self.localAssets[assetType][assetId]["file"] = fn
-                            mod = os.path.getmtime(fn)
-                            dt = datetime.datetime.fromtimestamp(mod)
-                            self.localAssets[assetType][assetId]["modified"] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                        else:
-                            self.log.trace("NOT installed asset", location)
-                else:
-                    self.log.trace("NOT installed asset", location)
+        # Directory listings are cached together with the mtime of the directory, so that
+        # only directories where something was added, removed or renamed are read again.
+        # Install directories are looked up in the listing of their parent directory, so
+        # that assets which are not installed do not cost any syscalls at all.
+        cache = self._getStore().getDirCache()
+        newCache = {}
+
+        self._installLocations = None
+        byParent = self._getInstallLocations()
+
+        for parent in byParent:
+            for entry in byParent[parent]:
+                info = self._checkInstalled(entry, cache, newCache)
+                if info is not None:
+                    self.localAssets[entry[0]][entry[1]] = info
 
         self.log.spam("Local assets", self.localAssets)
 
+        self._getStore().replaceDirCache(self._getStorableDirCache(newCache))
         self._writeLocalDB()
+        self._buildDownloadedIndex()
+
+        self.log.debug("Finished rebuilding local DB, seconds:", time.time() - startTime)
+
+    def _getInstallLocations(self):
+        """Return the install locations of all assets, grouped by parent directory, as a dict
+        of parent -> list of (assetType, assetId, location, pertinent file name)."""
+
+        if self._installLocations is None:
+            byParent = {}
+            for assetType in self.remoteAssets.keys():
+                for assetId in self.remoteAssets[assetType].keys():
+                    asset = self.remoteAssets[assetType][assetId]
+                    location = asset.getInstallPath()
+                    fn = asset.getPertinentFileName()
+                    if fn is not None:
+                        parent = os.path.dirname(os.path.normpath(location))
+                        byParent.setdefault(parent, []).append((assetType, assetId, location, fn))
+            self._installLocations = byParent
+        return self._installLocations
+
+    def _checkInstalled(self, entry, cache, newCache):
+        """Return the local DB record for an install location entry, or None if it is not installed."""
+
+        (assetType, assetId, location, fn) = entry
+        parentListing = self._listDirectory(os.path.dirname(os.path.normpath(location)), cache, newCache)
+        name = os.path.basename(os.path.normpath(location))
+        if parentListing is None or name not in parentListing or parentListing[name] is not None:
+            self.log.trace("NOT installed asset", location)
+            return None
+        listing = self._listDirectory(location, cache, newCache)
+        if listing is None or listing.get(fn) is None:
+            self.log.trace("NOT installed asset", location)
+            return None
+        self.log.trace("Installed asset location", location)
+        dt = datetime.datetime.fromtimestamp(listing[fn])
+        return { "file": os.path.join(location,fn), "modified": dt.strftime('%Y-%m-%d %H:%M:%S') }
+
+    def getWatchPaths(self):
+        """Return the directories which need to be watched to notice assets being installed or removed."""
+
+        paths = []
+        for parent in self._getInstallLocations():
+            if os.path.isdir(parent):
+                paths.append(parent)
+        for assetType in self.localAssets:
+            for assetId in self.localAssets[assetType]:
+                paths.append(os.path.dirname(os.path.normpath(self.localAssets[assetType][assetId]["file"])))
+        return paths
+
+    def refreshLocalDirectory(self, path):
+        """Update the local DB after something changed in the given directory. Returns the
+        asset directories in it, installed or not, so that files arriving in a directory which
+        was created before them are noticed."""
 
-        self.log.debug("Finished rebuilding local DB")
+        self.log.trace("Enter")
+
+        path = os.path.normpath(path)
+        byParent = self._getInstallLocations()
+
+        # Assets whose install directory is in the changed directory, or is the changed directory itself
+        entries = list(byParent.get(path, []))
+        parent = os.path.dirname(path)
+        for entry in byParent.get(parent, []):
+            if os.path.normpath(entry[2]) == path:
+                entries.append(entry)
+
+        if not entries:
+            return []
+
+        newCache = {}
+        assetDirs = []
+        store = self._getStore()
+
+        for entry in entries:
+            (assetType, assetId, location, fn) = entry
+            info = self._checkInstalled(entry, {}, newCache)
+            wasInstalled = assetId in self.localAssets.get(assetType, {})
+            if newCache.get(os.path.normpath(location), (None, None))[1] is not None:
+                assetDirs.append(os.path.normpath(location))
+            if info is not None:
+                if not wasInstalled:
+                    self.log.debug("Asset was installed outside of the downloader", location)
+                if self.localAssets.get(assetType, {}).get(assetId) != info:
+                    self.localAssets.setdefault(assetType, {})[assetId] = info
+                    self.downloadedIds.setdefault(assetType, set()).add(int(assetId))
+                    store.upsertLocalAsset(assetType, assetId, info["file"], info["modified"])
+            elif wasInstalled:
+                self.log.debug("Asset was removed outside of the downloader", location)
+                del self.localAssets[assetType][assetId]
+                self.downloadedIds.get(assetType, set()).discard(int(assetId))
+                store.deleteLocalAsset(assetId)
+
+        store.upsertDirCache(self._getStorableDirCache(newCache))
+
+        return assetDirs
+
+    def startWatching(self):
+        """Keep the local DB up to date with changes made outside of the downloader, unless
+        that has been turned off."""
+        if not self.isWatchingLocalAssets():
+            return
+        if self.watcher is None:
+            self.watcher = LocalAssetWatcher(self)
+        self.watcher.watch(self.getWatchPaths())
+
+    def stopWatching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def _listDirectory(self, path, cache, newCache):
+        """Return a dict of name -> mtime for the files in path, with None for subdirectories, or None if
+        path is not a directory. The cached listing is used if the directory has not changed."""
+
+        path = os.path.normpath(path)
+
+        if path in newCache:
+            return newCache[path][1]
+
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            # Remembered for the rest of the scan, since many assets share a missing parent directory
+            newCache[path] = (None, None)
+            return None
+
+        scanTime = time.time()
+
+        cached = cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            newCache[path] = cached
+            return cached[1]
+
+        self.log.trace("Reading changed directory", path)
+
+        listing = {}
+        try:
+            if hasattr(os, "scandir"):
+                for entry in os.scandir(path):
+                    if entry.is_dir():
+                        listing[entry.name] = None
+                    else:
+                        listing[entry.name] = entry.stat().st_mtime
+            else:
+                for name in os.listdir(path):
+                    fullPath = os.path.join(path, name)
+                    if os.path.isdir(fullPath):
+                        listing[name] = None
+                    else:
+                        listing[name] = os.path.getmtime(fullPath)
+        except OSError:
+            newCache[path] = (None, None)
+            return None
+
+        if abs(scanTime - mtime) < DIR_CACHE_RACY_SECONDS:
+            # Used for this scan, but stored without an mtime so that the next scan reads it again
+            mtime = None
+
+        newCache[path] = (mtime, listing)
+        return listing
+
+    def _getStorableDirCache(self, newCache):
+        return dict([(path, newCache[path]) for path in newCache if newCache[path][1] is not None])
 
     def _writeLocalDB(self):
-        with open(self.localdb,"wt") as f:
-            json.dump(self.localAssets, f, indent=2)
+        self._getStore().replaceLocalAssets(self.localAssets)
 
-    def getFilteredAssets(self, assetType, author=None, subtype=None, hasScreenshot=None, hasThumb=None, isDownloaded=None, title=None, desc=None, changed=None, license=None):
+    def getFilteredAssets(self, assetType, author=None, subtype=None, hasScreenshot=None, hasThumb=None, isDownloaded=None, title=None, desc=None, changed=None, license=None, newestFirst=False, within=None):
+        """Return the assets of the given type which match all the given criteria. If within is given,
+        only assets with ids in it are considered, which makes narrowing down an earlier result cheap."""
 
         outData = []
 
         self.log.debug("Requesting filter with limits", { "assetType": assetType, "author": author, "subtype": subtype})
 
-        afterDate = None
+        after = None
 
         if changed is not None:
             days = 36500
@@ -219,73 +831,107 @@ class AssetDB():
 
             dt = datetime.datetime.now()
             dt = dt - datetime.timedelta(days)
-            afterDate = dt.strftime('%Y-%m-%d %H:%M:%S')
-
-            self.log.debug("afterDate",afterDate)
-
-        if assetType in self.remoteAssets:
-            allData = self.remoteAssets[assetType]
-            for assetId in allData.keys():
-
-                asset = allData[assetId]
-                exclude = False
-
-                if assetType == "clothes" and subtype is not None:
-                    if subtype != asset.getCategory():
-                        exclude = True
-
-                if assetType == "material" and subtype is not None:
-                    btm = asset.belongs_to_metadata
-                    if not btm["belonging_is_assigned"] or not "belongs_to_core_asset" in btm:
-                        exclude = True
-
-                if author is not None:
-                    if author != asset.getAuthor():
-                        exclude = True
-
-                if title is not None:
-                    lt = title.lower()
-                    if not lt in asset.getTitle().lower():
-                        exclude = True
-
-                if desc is not None:
-                    lt = desc.lower()
-                    if not lt in asset.getDescription().lower():
-                        exclude = True
-
-                if license is not None:
-                    if license != asset.getLicense():
-                        exclude = True
-
-                if isDownloaded is not None:
-                    self.log.trace("isDownloaded",isDownloaded)
-                    if isDownloaded == "yes":
-                        self.log.trace("assetId",assetId)
-                        self.log.trace("assetType",assetType)
-                        if str(assetId) not in self.localAssets[assetType]:
-                            exclude = True
-                    else:
-                        if str(assetId) in self.localAssets[assetType]:
-                            exclude = True
+            after = calendar.timegm(dt.timetuple())
 
-                if afterDate is not None:
-                    assetChanged = asset.getChanged()
-                    self.log.trace("assetChanged",assetChanged)
-                    if assetChanged != "" and assetChanged is not None:
-                        if assetChanged < afterDate:
-                            exclude = True
+            self.log.debug("after",after)
 
-                if not exclude:
-                    outData.append(asset)
+        if not self.isSynchronized or assetType not in self.remoteAssets:
+            return outData
+
+        # The structured criteria are answered by the indexes of the catalog in the asset store
+        category = None
+        coreMaterial = None
+
+        if assetType == "clothes" and subtype is not None:
+            category = subtype
+
+        if assetType == "material" and subtype is not None:
+            coreMaterial = True
+
+        ordered = self._getStore().queryAssetIds(assetType, author=author, license=license, category=category, coreMaterial=coreMaterial,
+                                                 changedAfter=after, newestFirst=newestFirst)
+        candidates = set(ordered)
+
+        if within is not None:
+            candidates = candidates.intersection(within)
+
+        # The download state changes while the DB is in use, so it is kept in memory rather than in the query
+        downloaded = self.downloadedIds.get(assetType, set())
+
+        if isDownloaded == "yes":
+            candidates = candidates & downloaded
+        elif isDownloaded is not None:
+            candidates = candidates - downloaded
+
+        if not candidates:
+            return outData
+
+        # Text criteria are looked up in the full text indexes, which also rank the matches
+        scores = None
+
+        for (query, index) in [(title, self.titleIndex), (desc, self.descIndex)]:
+            if query is None:
+                continue
+            queryScores = index.search(query, candidates)
+            if queryScores is None:
+                continue
+            candidates = set(queryScores.keys())
+            if scores is None:
+                scores = queryScores
+            else:
+                scores = dict([(assetId, scores[assetId] + queryScores[assetId]) for assetId in candidates])
+
+        if scores is not None:
+            ordered = sorted(candidates, key=lambda assetId: (-scores[assetId], assetId))
+        else:
+            ordered = [assetId for assetId in ordered if assetId in candidates]
+
+        allData = self.remoteAssets[assetType]
+        for assetId in ordered:
+            outData.append(allData[assetId])
 
         return outData
 
+    def getCachedFiles(self):
+        """Return the set of all files in the per asset cache directories, using one directory
+        scan instead of checking for each file separately. Packed thumbnails are included."""
+
+        existingFiles = set()
+
+        if not os.path.exists(self.root):
+            return existingFiles
+
+        if hasattr(os, "scandir"):
+            for entry in os.scandir(self.root):
+                if entry.name.isdigit() and entry.is_dir():
+                    for fileEntry in os.scandir(entry.path):
+                        existingFiles.add(fileEntry.path)
+        else:
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name.isdigit() and os.path.isdir(path):
+                    for fn in os.listdir(path):
+                        existingFiles.add(os.path.join(path, fn))
+
+        # Packed thumbnails count as present at the path they would otherwise have
+        pack = self.getThumbnailPack()
+        if pack is not None:
+            for assetId in pack.getIds():
+                existingFiles.add(os.path.join(self.root, str(assetId), "thumb.png"))
+
+        self.log.debug("Number of files in asset cache", len(existingFiles))
+
+        return existingFiles
+
     def getDownloadTuples(self, ignoreExisting=True, onlyMeta=False, excludeThumb=False, excludeScreenshot=False):
         allData = []
+        existingFiles = None
+        if ignoreExisting:
+            existingFiles = self.getCachedFiles()
         for assetType in self.remoteAssets.keys():
             for assetId in self.remoteAssets[assetType].keys():
                 asset = self.remoteAssets[assetType][assetId]
-                tuples = asset.getDownloadTuples(ignoreExisting, onlyMeta, excludeThumb, excludeScreenshot)
+                tuples = asset.getDownloadTuples(ignoreExisting, onlyMeta, excludeThumb, excludeScreenshot, existingFiles=existingFiles)
                 allData.extend(tuples)
 
         return allData
@@ -300,13 +946,25 @@ class AssetDB():
         self.log.trace("Enter")
         filesToDownload = []
 
+        if self.isLazyThumbnails():
+            # Neither the thumbnail seed nor missing thumbnails are fetched, instead
+            # thumbnails are requested as assets are listed
+            downloadThumbnails = False
+
         self.downloadScreenshots = downloadScreenshots
         self.downloadThumbnails = downloadThumbnails
+        self.lastSyncChanges = None
 
         self.overrideProgressLength = 2
         self.overrideProgressAfterDownloads = 1
 
-        if not os.path.exists(self.root):
+        # Seed zips are fetched on the first sync, and again if an earlier attempt at
+        # fetching them was interrupted, in which case the download resumes
+        firstSync = not os.path.exists(self.remotedb)
+        resumeThumbSeed = os.path.exists(self.thumbseed + ".part")
+        resumeScreenSeed = os.path.exists(self.screenseed + ".part")
+
+        if firstSync or (resumeThumbSeed and downloadThumbnails) or (resumeScreenSeed and downloadScreenshots):
             if downloadThumbnails:
                 filesToDownload.append(["http://download.tuxfamily.org/makehuman/assets/asset-db-thumbnails.zip",self.thumbseed])
                 self.overrideProgressLength = self.overrideProgressLength + 2
@@ -315,9 +973,9 @@ class AssetDB():
                 filesToDownload.append(["http://download.tuxfamily.org/makehuman/assets/asset-db-screenshots.zip",self.screenseed])
                 self.overrideProgressLength = self.overrideProgressLength + 2
                 self.overrideProgressAfterDownloads = self.overrideProgressAfterDownloads + 1
-            filesToDownload.append(["http://www.makehumancommunity.org/sites/default/files/assets.json", self.remotedb + ".keep"])
+            filesToDownload.append(["http://www.makehumancommunity.org/sites/default/files/assets.json", self.remotedb + ".keep", { "conditional": True }])
         else:
-            filesToDownload.append(["http://www.makehumancommunity.org/sites/default/files/assets.json",self.remotedb])
+            filesToDownload.append(["http://www.makehumancommunity.org/sites/default/files/assets.json",self.remotedb, { "conditional": True }])
 
         self.log.debug("overrideProgressLength",self.overrideProgressLength)
         self.log.debug("overrideProgressAfterDownloads", self.overrideProgressAfterDownloads)
@@ -335,61 +993,87 @@ class AssetDB():
     def _syncRemote1Finished(self, code=0, file=None):
         self.log.trace("Enter")
 
-        progress = Progress()
-        current = self.overrideProgressAfterDownloads
-        prog = float(current) / float(self.overrideProgressLength)
-        progress(prog, desc="Unzipping seed zips")
-
-        if os.path.exists(self.thumbseed):
-            self.log.debug("HAS THUMB ZIP",self.thumbseed)
-            zip = ZipFile(self.thumbseed,'r')
-            if not os.path.exists(self.root):
-                os.makedirs(self.root)
-            zip.extractall(self.root)
-            zip.close()
-            if os.path.exists(self.remotedb):
-                os.remove(self.remotedb)
-            os.remove(self.thumbseed)
-            current = current + 1
-            prog = float(current) / float(self.overrideProgressLength)
-            progress(prog, desc="Unzipping seed zips")
-        else:
-            self.log.debug("Did not have thumb seed zip")
-
-        if os.path.exists(self.screenseed):
-            self.log.debug("HAS SCREEN ZIP",self.screenseed)
-            zip = ZipFile(self.screenseed,'r')
-            if not os.path.exists(self.root):
-                os.makedirs(self.root)
-            zip.extractall(self.root)
-            zip.close()
-            if os.path.exists(self.remotedb):
-                os.remove(self.remotedb)
-            os.remove(self.screenseed)
-        else:
-            self.log.debug("Did not have screen seed zip")
+        hasSeeds = os.path.exists(self.thumbseed) or os.path.exists(self.screenseed)
+        notModified = self.remotedb in self._downloadTask.notModified
+
+        scopeChanged = self.loadedSyncTypes != self.syncTypes
+
+        if notModified and self.isSynchronized and not hasSeeds and not self.downloadScreenshots and not scopeChanged:
+            # Nothing has changed on the server since the last sync, so there is no
+            # need to parse the remote DB or check the disk for files to download
+            self.log.debug("Remote asset DB has not changed since last sync")
+            self.lastSyncChanges = { "added": [], "changed": [], "removed": [] }
+            self.overrideProgressLength = None
+            self.overrideProgressAfterDownloads = None
+            self._getStore().setMeta("syncedTypes", json.dumps(self.loadedSyncTypes))
+            if self._synconFinished is not None:
+                self._synconFinished()
+            return
 
-        current = current + 1
-        prog = float(current) / float(self.overrideProgressLength)
-        progress(prog, desc="Checking for additional files to download")
+        seeds = []
+        for seed in [self.thumbseed, self.screenseed]:
+            if os.path.exists(seed):
+                self.log.debug("Has seed zip", seed)
+                seeds.append(seed)
 
         self.overrideProgressLength = None
         self.overrideProgressAfterDownloads = None
 
         if os.path.exists(self.remotedb + ".keep"):
-            os.rename(self.remotedb + ".keep", self.remotedb)
+            replaceFile(self.remotedb + ".keep", self.remotedb)
+            if os.path.exists(self.remotedb + ".keep.validators"):
+                replaceFile(self.remotedb + ".keep.validators", self.remotedb + ".validators")
+
+        previousAssets = None
+        if self.isSynchronized:
+            previousAssets = dict(self.assetsById)
+
+        self._loadRemoteDB(self.getSyncTypes(), previousAssets, self.loadedSyncTypes)
+
+        if seeds:
+            # Extraction runs in a worker thread, and the sync continues when it has finished.
+            # Only the directories of the assets in the sync scope are extracted.
+            self._syncSeeds = seeds
+            includeDirs = set([str(assetId) for assetId in self.assetsById])
+            self._extractTask = ExtractTask(self._syncParentWidget, seeds, self.root, self._syncExtractFinished, includeDirs=includeDirs)
+        else:
+            self.log.debug("Did not have any seed zip")
+            self._syncSeeds = []
+            self._syncExtractFinished()
 
-        self._loadRemoteDB()
+    def _syncExtractFinished(self):
+        self.log.trace("Enter")
+
+        self._extractTask = None
+
+        for seed in self._syncSeeds:
+            os.remove(seed)
+
+        progress = Progress()
+        progress(0.5, desc="Checking for additional files to download")
 
         filesToDownload = []
 
+        # Changed assets may have new thumbnails and screenshots, so these are downloaded
+        # again even if there already are files for them in the cache
+        changedIds = set()
+        if self.lastSyncChanges is not None:
+            changedIds = set(self.lastSyncChanges["changed"])
+
         self.log.debug("downloadScreenshots",self.downloadScreenshots)
         self.log.debug("downloadThumbnails",self.downloadThumbnails)
 
+        if changedIds and self.isLazyThumbnails():
+            # Thumbnails are not downloaded during the sync then, so the outdated ones are
+            # dropped instead, and the new ones are fetched when the assets are shown
+            self._invalidateThumbnails(changedIds)
+
+        existingFiles = self.getCachedFiles()
+
         for assetType in self.remoteAssets.keys():
             for assetId in self.remoteAssets[assetType].keys():
                 remoteAsset = self.remoteAssets[assetType][assetId]
-                tuples = remoteAsset.getDownloadTuples(ignoreExisting=True,onlyMeta=True,excludeScreenshot=not self.downloadScreenshots,excludeThumb=not self.downloadThumbnails)
+                tuples = remoteAsset.getDownloadTuples(ignoreExisting=assetId not in changedIds,onlyMeta=True,excludeScreenshot=not self.downloadScreenshots,excludeThumb=not self.downloadThumbnails,existingFiles=existingFiles)
                 self.log.spam("Tuples",tuples)
                 filesToDownload.extend(tuples)
 
@@ -406,16 +1090,76 @@ class AssetDB():
     def _syncRemote2Finished(self, code=0, file=None):
         self.log.trace("Enter")
 
+        conversions = self.getScreenshotConversions(self.getCachedFiles())
+        if conversions:
+            self._convertTask = ConvertTask(self._syncParentWidget, conversions, self._syncConvertFinished)
+        else:
+            self._syncConvertFinished([])
+
+    def _syncConvertFinished(self, converted):
+        self.log.trace("Enter")
+
+        self._convertTask = None
+
+        # From now on the catalog is loaded with the scope of this sync
+        self._getStore().setMeta("syncedTypes", json.dumps(self.loadedSyncTypes))
+
         progress = Progress()
         progress(0.1, desc="Rebuilding local asset DB")
         self._rebuildLocalDB()
         progress(0.5, desc="Loading local asset DB")
         self._loadLocalDB()
+        if self.isPackedThumbnails():
+            if self.lastSyncChanges is not None:
+                self.getThumbnailPack().remove(self.lastSyncChanges["removed"])
+            self._packThumbnails()
         progress(1.0)
 
+        if self.watcher is not None:
+            self.watcher.watch(self.getWatchPaths())
+
         if self._synconFinished is not None:
             self._synconFinished()
 
+    def getScreenshotConversions(self, existingFiles):
+        """Return (asset id, source, destination) tuples for the downloaded screenshots which have not
+        yet been converted to size capped jpeg files."""
+
+        conversions = []
+        for assetId in self.assetsById:
+            conversion = self._getScreenshotConversion(self.assetsById[assetId], existingFiles)
+            if conversion is not None:
+                conversions.append(conversion)
+        return conversions
+
+    def _getScreenshotConversion(self, asset, existingFiles=None):
+        if "screenshot" not in asset.localFiles:
+            return None
+        source = asset.localFiles["screenshot"]
+        dest = asset.getConvertedScreenshotPath()
+        if existingFiles is not None:
+            if source not in existingFiles:
+                return None
+        elif not os.path.exists(source):
+            return None
+        return (asset.getId(), source, dest)
+
+    def convertScreenshots(self, parentWidget, assets, onFinished=None):
+        """Convert the downloaded screenshots of the given assets in the background."""
+
+        conversions = [self._getScreenshotConversion(asset) for asset in assets]
+        conversions = [conversion for conversion in conversions if conversion is not None]
+        if not conversions:
+            return
+
+        self._convertonFinished = onFinished
+        self._screenshotConvertTask = ConvertTask(parentWidget, conversions, self._convertFinished)
+
+    def _convertFinished(self, converted):
+        self._screenshotConvertTask = None
+        if self._convertonFinished is not None:
+            self._convertonFinished(converted)
+
     def downloadItem(self, parentWidget, remoteAsset, onFinished=None, onProgress=None):
         self.log.trace("Enter")
 
@@ -450,13 +1194,24 @@ class AssetDB():
         self.log.debug("srcThumb",srcThumb)
         self.log.debug("destThumb", os.path.join(dn,name + ".thumb"))
 
-        if srcThumb:
-            destThumb = os.path.join(dn,name + ".thumb")
-            shutil.copyfile(srcThumb,destThumb)
-
         assetType = remoteAsset.getType()
         assetId = remoteAsset.getId()
 
+        # The thumbnail was downloaded again, and the packed copy would hide the new file
+        pack = self.getThumbnailPack()
+        if pack is not None:
+            pack.remove([assetId])
+
+        if srcThumb:
+            thumbData = self.getThumbData(remoteAsset)
+            if thumbData is None:
+                self.log.warn("Asset has no thumbnail to install", assetId)
+            else:
+                with open(os.path.join(dn,name + ".thumb"), "wb") as f:
+                    f.write(thumbData)
+            if pack is not None and thumbData is not None:
+                self.getThumbnailQueue().packFiles({ assetId: srcThumb })
+
         file = os.path.join(dn,fn)
 
         self.log.debug("Downloaded file should be",file)
@@ -470,8 +1225,9 @@ class AssetDB():
         modified = dt.strftime('%Y-%m-%d %H:%M:%S')
 
         self.localAssets[assetType][assetId] = { "file": file, "modified": modified }
+        self.downloadedIds.setdefault(assetType, set()).add(int(assetId))
 
-        self._writeLocalDB()
+        self._getStore().upsertLocalAsset(assetType, assetId, file, modified)
 
         if self._downloadonFinished is not None:
             self._downloadonFinished()
@@ -58,8 +58,21 @@ else:
         from PyQt4.QtCore import *
 
 from .assetdb import AssetDB
-from .tablemodel import AssetTableModel
+from .tablemodel import AssetTableModel, SORT_ROLE, foldCase, truncateText
+from .listmodel import AssetListModel, ThumbnailLoader, ICON_SIZE
 from .downloadtask import DownloadTask
+from .pixmapcache import PixmapCache, DEFAULT_MEGABYTES
+
+# Max number of new and updated assets to list by title after a sync
+MAX_LISTED_CHANGES = 10
+
+# Sizes at which thumbnails and screenshots are shown
+THUMBNAIL_SIZE = 128
+SCREENSHOT_WIDTH = 800
+SCREENSHOT_HEIGHT = 600
+
+# Milliseconds to wait after the last change of a filter criterion before filtering
+FILTER_DELAY = 300
 
 class AssetDownloadTaskView(gui3d.TaskView):
 
@@ -69,7 +82,12 @@ class AssetDownloadTaskView(gui3d.TaskView):
         self.log = mhapi.utility.getLogChannel("assetdownload")
 
         self.notfound = mhapi.locations.getSystemDataPath("notfound.thumb")
-        self.assetdb = AssetDB(self)
+
+        self.pixmapCache = PixmapCache()
+
+        # The asset DB is loaded the first time the tab is shown, so that users
+        # who never visit the tab do not pay for it when MakeHuman starts
+        self.assetdb = None
 
         self._setupFilterBox()
         self._setupSelectedBox()
@@ -78,17 +96,48 @@ class AssetDownloadTaskView(gui3d.TaskView):
         self._setupDetails()
 
         self.currentlySelectedRemoteAsset = None
+        self.downloadingAsset = None
         self.isShowingDetails = False
 
     def onShow(self, event):
 
-        if not os.path.exists(self.assetdb.root):
+        if self.assetdb is None:
+            self._loadAssetDB()
+
+        if not self.assetdb.isSynchronized:
             msg = "It seem that the asset database has not been downloaded yet. The asset database is needed in order to search for assets.\n\n"
             msg = msg + "Downloading the database for the first time can take a long time on a slow connection, and it is normal that it occasionally "
             msg = msg + "looks as if the download has stalled. Updating the database after it has been downloaded will be significantly faster.\n\n"
             msg = msg + "After closing this dialog, click 'synchronize' in order to start downloading the asset database."
             self.showMessage(msg)
 
+    def shutdown(self):
+        """Stop the background work of the asset DB, when the plugin is unloaded."""
+        if self.assetdb is not None:
+            self.assetdb.close()
+            self.assetdb = None
+
+    def _loadAssetDB(self):
+        self.log.trace("Enter")
+        self.assetdb = AssetDB(self)
+        self.assetdb.startWatching()
+        self.assetdb.getThumbnailQueue().signalThumbnailReady.connect(self._onThumbnailReady)
+        self.thumbLoader = ThumbnailLoader(self.assetdb, self.pixmapCache)
+        self.thumbLoader.signalLoaded.connect(self._onIconLoaded)
+        self.thumbLoader.signalMissing.connect(self._onIconMissing)
+        self._updateSyncSettings()
+        self._updateAuthors()
+        self._onTypeChange(str(self.cbxTypes.getCurrentItem()))
+
+    def _updateAuthors(self):
+        self.authors = ["-- any --"]
+        self.authors.extend(sorted(self.assetdb.getKnownAuthors(), key=lambda s: s.lower()))
+
+        self.cbxAuthors.clear()
+
+        for author in self.authors:
+            self.cbxAuthors.addItem(author)
+
     def _setupFilterBox(self):
         self.log.trace("Enter")
         self.filterBox = mhapi.ui.createGroupBox("Filter assets")
@@ -118,7 +167,6 @@ class AssetDownloadTaskView(gui3d.TaskView):
         self.filterBox.addWidget(self.cbxSubTypes)
 
         self.authors = ["-- any --"]
-        self.authors.extend(sorted(self.assetdb.getKnownAuthors(), key=lambda s: s.lower()))
 
         self.filterBox.addWidget(mhapi.ui.createLabel("\nAsset author"))
         self.cbxAuthors = mhapi.ui.createComboBox(self.authors)
@@ -158,6 +206,10 @@ class AssetDownloadTaskView(gui3d.TaskView):
         self.txtDesc = mhapi.ui.createTextEdit()
         self.filterBox.addWidget(self.txtDesc)
 
+        self.filterBox.addWidget(mhapi.ui.createLabel("\nShow results as"))
+        self.cbxResultView = mhapi.ui.createComboBox(["table", "thumbnail grid"])
+        self.filterBox.addWidget(self.cbxResultView)
+
         self.filterBox.addWidget(mhapi.ui.createLabel(" "))
         self.btnFilter = mhapi.ui.createButton("Update list")
         self.filterBox.addWidget(self.btnFilter)
@@ -166,13 +218,27 @@ class AssetDownloadTaskView(gui3d.TaskView):
         def onClicked(event):
             self._onBtnFilterClick()
 
+        # The list is also filtered while typing and when a criterion is picked, once changes pause
+        self.filterTimer = QTimer()
+        self.filterTimer.setSingleShot(True)
+        self.filterTimer.timeout.connect(self._onFilterTimeout)
+
+        self.txtTitle.textEdited.connect(self._scheduleFilter)
+        self.txtDesc.textEdited.connect(self._scheduleFilter)
+        for cbx in [self.cbxTypes, self.cbxSubTypes, self.cbxAuthors, self.cbxLicense, self.cbxDownloaded, self.cbxUpdated, self.cbxResultView]:
+            cbx.activated.connect(self._scheduleFilter)
+
+        # Criteria and asset ids of the list which is shown, which a following filter may narrow down
+        self.lastFilter = None
+        self.lastFilterIds = None
+
         self.addLeftWidget(self.filterBox)
 
     def _onTypeChange(self,newValue):
         self.log.trace("Enter")
         self.log.debug("Asset type changed to",newValue)
 
-        if newValue == "clothes":
+        if newValue == "clothes" and self.assetdb is not None:
             self.cbxSubTypes.clear()
             self.cbxSubTypes.addItem("-- any --")
             for type in self.assetdb.getKnownClothesCategories():
@@ -186,8 +252,22 @@ class AssetDownloadTaskView(gui3d.TaskView):
 
     def _onBtnFilterClick(self):
         self.log.trace("Enter")
-        oldlen = len(self.headers)
+        self.filterTimer.stop()
+
+        # The button always filters the whole catalog, which also picks up assets downloaded since
+        self.lastFilter = None
+        self._filter()
 
+    def _scheduleFilter(self, *args):
+        self.filterTimer.start(FILTER_DELAY)
+
+    def _onFilterTimeout(self):
+        self.log.trace("Enter")
+        if self.assetdb is None or not self.assetdb.isSynchronized:
+            return
+        self._filter()
+
+    def _getFilter(self):
         author = None
         subtype = None
         changed = None
@@ -221,31 +301,138 @@ class AssetDownloadTaskView(gui3d.TaskView):
         if downloaded == "-- any --":
             downloaded = None
 
-        assets = self.assetdb.getFilteredAssets(assetType, author=author, subtype=subtype, title=title, isDownloaded=downloaded, desc=desc, changed=changed, license=license)
+        return {
+            "assetType": assetType,
+            "author": author,
+            "subtype": subtype,
+            "title": title,
+            "desc": desc,
+            "license": license,
+            "changed": changed,
+            "downloaded": downloaded,
+            "view": str(self.cbxResultView.getCurrentItem())
+        }
+
+    def _isNarrowing(self, last, criteria):
+        """Return True if every asset matching criteria also matches last, in which case only the
+        assets of the last result need to be checked."""
+
+        for key in criteria:
+            if key not in ["title", "desc"] and criteria[key] != last[key]:
+                return False
+
+        # Assets may have been downloaded or removed since the last filter
+        if criteria["downloaded"] is not None:
+            return False
+
+        # Search terms have to match all of their words, so adding to the end of the text can only
+        # add words or lengthen the last word, both of which match fewer assets
+        for key in ["title", "desc"]:
+            if last[key] is None:
+                continue
+            if criteria[key] is None or not criteria[key].lower().startswith(last[key].lower()):
+                return False
+
+        return True
+
+    def _filter(self):
+        oldlen = len(self.headers)
+
+        # Thumbnails still queued for the previous results are not needed any more
+        self.assetdb.cancelThumbnailRequests()
+
+        criteria = self._getFilter()
+        last = self.lastFilter
+
+        # Rows are changed in place rather than rebuilt when the same kind of list is still shown
+        incremental = last is not None and last["assetType"] == criteria["assetType"] and last["view"] == criteria["view"]
+
+        within = None
+        if incremental and self._isNarrowing(last, criteria):
+            within = self.lastFilterIds
+
+        assets = self.assetdb.getFilteredAssets(criteria["assetType"], author=criteria["author"], subtype=criteria["subtype"], title=criteria["title"],
+                                                isDownloaded=criteria["downloaded"], desc=criteria["desc"], changed=criteria["changed"], license=criteria["license"],
+                                                newestFirst=True, within=within)
+
+        self.log.debug("Filtered assets", { "count": len(assets), "incremental": incremental, "narrowed": within is not None })
+
+        if criteria["view"] == "thumbnail grid":
+            self._showGrid(assets, incremental)
+        else:
+            self._showTable(assets, oldlen, incremental)
+
+        self.lastFilter = criteria
+        self.lastFilterIds = set([asset.getId() for asset in assets])
+
+        self.hasFilter = True
+        selected = self.currentlySelectedRemoteAsset
+        if not incremental or selected is None or selected.getId() not in self.lastFilterIds:
+            self.currentlySelectedRemoteAsset = None
+            self.thumbnail.setPixmap(QtGui.QPixmap(os.path.abspath(self.notfound)))
+
+        self._showResultView()
+        self.detailsPanel.hide()
+        self.isShowingDetails = False
+        self.btnDetails.setText("View details")
+
+    def _showGrid(self, assets, incremental=False):
+        if incremental:
+            self.listModel.setAssets(assets)
+            return
+
+        # The grid loads thumbnails for visible rows itself, fetching those which are missing
+        self.thumbLoader.cancel()
+        self.listModel = AssetListModel(assets, self.thumbLoader, self.pixmapCache, self.iconPlaceholder)
+        self.listView.setModel(self.listModel)
+        self.resultView = self.listView
+
+    def _showTable(self, assets, oldlen, incremental=False):
+        self.listModel = None
+        data = []
 
-        self.data = []
+        self.headers = ["node id", "author", "license", "changed", "title", "description"]
 
-        self.headers = ["node id", "author", "license", "title", "description"]
+        # Sort keys are computed once here, so that sorting compares ints and short
+        # case folded strings instead of converting and comparing display strings
+        sortKeys = []
+        toolTips = []
 
         for asset in assets:
-            self.data.append( [ str(asset.getId()), asset.getAuthor(), asset.getLicense(), asset.getTitle(), asset.getDescription() ])
+            description = asset.getDescription()
+            shownDescription = truncateText(description)
+            data.append( [ str(asset.getId()), asset.getAuthor(), asset.getLicense(), asset.getChanged() or "", asset.getTitle(), shownDescription ])
+            sortKeys.append( [ asset.getId(), foldCase(asset.getAuthor()), foldCase(asset.getLicense()), asset.getChangedTimestamp() or 0, foldCase(asset.getTitle()), foldCase(shownDescription) ])
+            toolTip = [ None ] * len(self.headers)
+            if shownDescription != description:
+                toolTip[-1] = description
+            toolTips.append(toolTip)
+
+        if self.assetdb.isLazyThumbnails():
+            self.assetdb.requestThumbnails(assets)
+
+        if incremental:
+            # The model changes self.data in place
+            self.model.setRows(data, sortKeys, toolTips)
+            return
 
-        self.model = AssetTableModel(self.data,self.headers)
+        self.data = data
+        self.model = AssetTableModel(self.data,self.headers,sortKeys=sortKeys,toolTips=toolTips)
         self.proxymodel = QSortFilterProxyModel()
+        self.proxymodel.setSortRole(SORT_ROLE)
         self.proxymodel.setSourceModel(self.model)
         self.tableView.setModel(self.proxymodel)
 
         self.tableView.columnCountChanged(oldlen, len(self.headers))
         self.tableView.resizeColumnsToContents()
+        self.resultView = self.tableView
 
-        self.hasFilter = True
-        self.currentlySelectedRemoteAsset = None
-        self.thumbnail.setPixmap(QtGui.QPixmap(os.path.abspath(self.notfound)))
-
-        self.tableView.show()
-        self.detailsPanel.hide()
-        self.isShowingDetails = False
-        self.btnDetails.setText("View details")
+    def _showResultView(self):
+        for view in [self.tableView, self.listView]:
+            if view is self.resultView:
+                view.show()
+            else:
+                view.hide()
 
     def _setupSelectedBox(self):
         self.log.trace("Enter")
@@ -280,7 +467,7 @@ class AssetDownloadTaskView(gui3d.TaskView):
         self.log.trace("Enter")
 
         if self.isShowingDetails:
-            self.tableView.show()
+            self._showResultView()
             self.detailsPanel.hide()
             self.isShowingDetails = False
             self.btnDetails.setText("View details")
@@ -293,7 +480,7 @@ class AssetDownloadTaskView(gui3d.TaskView):
         title = self.currentlySelectedRemoteAsset.getTitle()
         self.log.debug("Request details for asset with title",title)
 
-        self.tableView.hide()
+        self.resultView.hide()
         self.detailsPanel.show()
         self.btnDetails.setText("Hide details")
         self.isShowingDetails = True
@@ -315,6 +502,7 @@ class AssetDownloadTaskView(gui3d.TaskView):
         title = self.currentlySelectedRemoteAsset.getTitle()
         self.log.debug("Request download of asset with title",title)
 
+        self.downloadingAsset = self.currentlySelectedRemoteAsset
         self.assetdb.downloadItem(self.syncBox,self.currentlySelectedRemoteAsset,self._downloadItemFinished)
 
     def _downloadItemFinished(self, code=0, file=None):
@@ -325,6 +513,8 @@ class AssetDownloadTaskView(gui3d.TaskView):
                     + "possibly as a comment on the asset page."
             self.showMessage(msg)
         else:
+            # The thumbnail was downloaded again with the asset
+            self.pixmapCache.invalidate(self.downloadingAsset.getId())
             self.showMessage("Finished downloading")
 
     def _setupSyncBox(self):
@@ -346,10 +536,32 @@ class AssetDownloadTaskView(gui3d.TaskView):
         syncinstr = syncinstr + "This is hundreds of\n"
         syncinstr = syncinstr + "megabytes, so avoid\n"
         syncinstr = syncinstr + "unless important.\n"
+        syncinstr = syncinstr + "\nWith thumbnails on\n"
+        syncinstr = syncinstr + "demand, thumbnails\n"
+        syncinstr = syncinstr + "are fetched as assets\n"
+        syncinstr = syncinstr + "are listed, which\n"
+        syncinstr = syncinstr + "makes syncing faster.\n"
 
         self.syncBox.addWidget(mhapi.ui.createLabel(syncinstr))
 
         self.fetchScreens = self.syncBox.addWidget(gui.CheckBox('get screenshots'))
+        self.lazyThumbs = self.syncBox.addWidget(gui.CheckBox('thumbnails on demand'))
+        self.packThumbs = self.syncBox.addWidget(gui.CheckBox('pack thumbnails in one file'))
+        self.watchLocal = self.syncBox.addWidget(gui.CheckBox('notice assets installed by hand', True))
+
+        @self.watchLocal.mhEvent
+        def onClicked(event):
+            self._onWatchLocalClick()
+
+        self.syncBox.addWidget(mhapi.ui.createLabel("\nImage memory cache"))
+        self.cbxPixmapCache = mhapi.ui.createComboBox(["16 MB", "64 MB", "256 MB"], self._onPixmapCacheChange)
+        self.syncBox.addWidget(self.cbxPixmapCache)
+
+        self.syncBox.addWidget(mhapi.ui.createLabel("\nAsset types to sync"))
+
+        self.syncTypeBoxes = {}
+        for assetType in self.types:
+            self.syncTypeBoxes[assetType] = self.syncBox.addWidget(gui.CheckBox(assetType, True))
 
         self.btnSync = mhapi.ui.createButton("Synchronize")
         self.syncBox.addWidget(self.btnSync)
@@ -358,23 +570,101 @@ class AssetDownloadTaskView(gui3d.TaskView):
         def onClicked(event):
             self._onBtnSyncClick(downloadScreenshots=self.fetchScreens.selected)
 
+        self.btnCompact = mhapi.ui.createButton("Compact thumbnails")
+        self.syncBox.addWidget(self.btnCompact)
+
+        @self.btnCompact.mhEvent
+        def onClicked(event):
+            self._onBtnCompactClick()
+
         self.addRightWidget(self.syncBox)
 
+    def _updateSyncSettings(self):
+        self.lazyThumbs.setSelected(self.assetdb.isLazyThumbnails())
+        self.packThumbs.setSelected(self.assetdb.isPackedThumbnails())
+        self.watchLocal.setSelected(self.assetdb.isWatchingLocalAssets())
+        megabytes = self.assetdb.getPixmapCacheMegabytes(DEFAULT_MEGABYTES)
+        self.pixmapCache.setMaxBytes(megabytes * 1024 * 1024)
+        index = self.cbxPixmapCache.findText(str(megabytes) + " MB")
+        if index >= 0:
+            self.cbxPixmapCache.setCurrentIndex(index)
+        syncTypes = self.assetdb.getSyncTypes()
+        for assetType in self.syncTypeBoxes:
+            self.syncTypeBoxes[assetType].setSelected(syncTypes is None or assetType in syncTypes)
+
     def _onBtnSyncClick(self, downloadScreenshots=False):
         self.log.trace("Enter")
+
+        syncTypes = sorted([assetType for assetType in self.types if self.syncTypeBoxes[assetType].selected])
+        if not syncTypes:
+            self.showMessage("Select at least one asset type to synchronize")
+            return
+        if len(syncTypes) == len(self.types):
+            syncTypes = None
+        if syncTypes != self.assetdb.getSyncTypes():
+            self.assetdb.setSyncTypes(syncTypes)
+        if self.lazyThumbs.selected != self.assetdb.isLazyThumbnails():
+            self.assetdb.setLazyThumbnails(self.lazyThumbs.selected)
+        if self.packThumbs.selected != self.assetdb.isPackedThumbnails():
+            self.assetdb.setPackedThumbnails(self.packThumbs.selected)
         self.assetdb.synchronizeRemote(self.syncBox,self._onSyncFinished,self._onSyncProgress, downloadScreenshots=downloadScreenshots)
 
+    def _onPixmapCacheChange(self, newValue):
+        megabytes = int(str(newValue).split()[0])
+        self.pixmapCache.setMaxBytes(megabytes * 1024 * 1024)
+        if self.assetdb is not None and megabytes != self.assetdb.getPixmapCacheMegabytes(DEFAULT_MEGABYTES):
+            self.assetdb.setPixmapCacheMegabytes(megabytes)
+
+    def _onWatchLocalClick(self):
+        if self.assetdb is not None and self.watchLocal.selected != self.assetdb.isWatchingLocalAssets():
+            self.assetdb.setWatchingLocalAssets(self.watchLocal.selected)
+
+    def _onBtnCompactClick(self):
+        self.log.trace("Enter")
+        if not self.assetdb.isPackedThumbnails():
+            self.showMessage("Thumbnails are not packed, so there is nothing to compact")
+            return
+        reclaimed = self.assetdb.compactThumbnails()
+        self.showMessage("Compacted the thumbnail pack, reclaiming " + str(reclaimed // 1024) + " kB")
+
     def _onSyncFinished(self, code=0, file=None):
         self.log.trace("onSyncFinished")
-        self.showMessage("Asset DB is now synchronized")
 
-        self.authors = ["-- any --"]
-        self.authors.extend(sorted(self.assetdb.getKnownAuthors(), key=lambda s: s.lower()))
+        # Thumbnails and screenshots of changed assets may have been replaced
+        self.pixmapCache.clear()
 
-        self.cbxAuthors.clear()
+        # The shown list refers to assets from before the sync
+        self.lastFilter = None
+        self.lastFilterIds = None
 
-        for author in self.authors:
-            self.cbxAuthors.addItem(author)
+        msg = "Asset DB is now synchronized"
+        changes = self.assetdb.getLastSyncChanges()
+        if changes is not None:
+            msg = msg + "\n\n" + self._describeSyncChanges(changes)
+        self.showMessage(msg)
+
+        self._updateAuthors()
+
+    def _describeSyncChanges(self, changes):
+        if not changes["added"] and not changes["changed"] and not changes["removed"]:
+            return "There were no new or updated assets."
+
+        msg = "New assets: " + str(len(changes["added"])) + "\n"
+        msg = msg + "Updated assets: " + str(len(changes["changed"])) + "\n"
+        msg = msg + "Removed assets: " + str(len(changes["removed"]))
+
+        for (label, key) in [("New", "added"), ("Updated", "changed")]:
+            titles = []
+            for assetId in changes[key][:MAX_LISTED_CHANGES]:
+                asset = self.assetdb.assetsById.get(assetId)
+                if asset is not None:
+                    titles.append("  " + asset.getTitle() + " (" + asset.getType() + ")")
+            if titles:
+                msg = msg + "\n\n" + label + ":\n" + "\n".join(titles)
+                if len(changes[key]) > MAX_LISTED_CHANGES:
+                    msg = msg + "\n  ... and " + str(len(changes[key]) - MAX_LISTED_CHANGES) + " more"
+
+        return msg
 
     def _onSyncProgress(self,prog=0.0):
         self.log.trace("onSyncProgress")
@@ -407,6 +697,24 @@ class AssetDownloadTaskView(gui3d.TaskView):
 
         self.addTopWidget(self.tableView)
 
+        self.listModel = None
+        self.iconPlaceholder = QtGui.QPixmap(os.path.abspath(self.notfound)).scaled(ICON_SIZE, ICON_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        self.listView = QListView()
+        self.listView.setViewMode(QListView.IconMode)
+        self.listView.setIconSize(QSize(ICON_SIZE, ICON_SIZE))
+        self.listView.setGridSize(QSize(ICON_SIZE + 40, ICON_SIZE + 40))
+        self.listView.setResizeMode(QListView.Adjust)
+        self.listView.setMovement(QListView.Static)
+        self.listView.setUniformItemSizes(True)
+        self.listView.setWordWrap(True)
+        self.listView.setSelectionMode(selmode)
+        self.listView.clicked.connect(self._listClick)
+
+        self.addTopWidget(self.listView)
+        self.listView.hide()
+
+        self.resultView = self.tableView
         self.hasFilter = False
 
     def _onBtnDownloadScreenshotClick(self):
@@ -418,13 +726,17 @@ class AssetDownloadTaskView(gui3d.TaskView):
     def _afterScreenshotDownloaded(self, code=0, file=None):
         self.log.debug("Downloaded")
         remoteAsset = self.currentlySelectedRemoteAsset
-        render = remoteAsset.getScreenshotPath()
+        self.pixmapCache.invalidate(remoteAsset.getId())
+        pixmap = self._getPixmap(remoteAsset, "screenshot", SCREENSHOT_WIDTH, SCREENSHOT_HEIGHT)
 
-        if render is not None and render != "" and os.path.exists(render):
-            self.detailsRender.setPixmap(QtGui.QPixmap(os.path.abspath(render)))
-            self.detailsRender.setGeometry(0, 0, 800, 600)
+        if pixmap is not None:
+            self.detailsRender.setPixmap(pixmap)
+            self.detailsRender.setGeometry(0, 0, SCREENSHOT_WIDTH, SCREENSHOT_HEIGHT)
             self.btnDownloadScreenshot.hide()
 
+        # The cached pixmap stays valid, since the converted screenshot has the size it is shown at
+        self.assetdb.convertScreenshots(self, [remoteAsset])
+
     def _setupDetails(self):
         self.log.trace("Enter")
 
@@ -495,18 +807,33 @@ class AssetDownloadTaskView(gui3d.TaskView):
         self.log.spam("Currently selected row data", self.data[currentRow])
 
         assetId = int(self.data[currentRow][0])
-        assetType = str(self.cbxTypes.getCurrentItem())
 
         self.log.debug("Currently selected asset id", assetId)
 
-        remoteAsset = self.assetdb.remoteAssets[assetType][assetId]
+        # The type combo box may already have been changed for a filter which has not run yet
+        remoteAsset = self.assetdb.assetsById.get(assetId)
+        if remoteAsset is None:
+            self.log.debug("Asset is no longer known", assetId)
+            return
 
-        thumbPath = remoteAsset.getThumbPath()
+        self._selectAsset(remoteAsset)
 
-        if thumbPath is not None:
-            self.thumbnail.setPixmap(QtGui.QPixmap(os.path.abspath(thumbPath)))
-        else:
+    def _listClick(self, index):
+        self.log.trace("List click")
+
+        if self.listModel is None:
+            return
+
+        remoteAsset = self.listModel.getAsset(index.row())
+        if remoteAsset is not None:
+            self._selectAsset(remoteAsset)
+
+    def _selectAsset(self, remoteAsset):
+
+        if not self._showThumbnail(remoteAsset):
             self.log.debug("Asset has no thumbnail")
+            if remoteAsset.getThumbPath() is not None:
+                self.assetdb.requestThumbnailNow(remoteAsset)
 
         self.thumbnail.setGeometry(0, 0, 128, 128)
 
@@ -523,17 +850,77 @@ class AssetDownloadTaskView(gui3d.TaskView):
         extras = extras + "</tt>"
         self.detailsExtras.setText(extras)
 
-        render = remoteAsset.getScreenshotPath()
+        pixmap = self._getPixmap(remoteAsset, "screenshot", SCREENSHOT_WIDTH, SCREENSHOT_HEIGHT)
 
-        if render is not None and render != "" and os.path.exists(render):
-            self.detailsRender.setPixmap(QtGui.QPixmap(os.path.abspath(render)))
-            self.detailsRender.setGeometry(0, 0, 800, 600)
+        if pixmap is not None:
+            self.detailsRender.setPixmap(pixmap)
+            self.detailsRender.setGeometry(0, 0, SCREENSHOT_WIDTH, SCREENSHOT_HEIGHT)
             self.btnDownloadScreenshot.hide()
         else:
             self.detailsRender.setPixmap(QtGui.QPixmap(mhapi.locations.getSystemDataPath("notfound.thumb")))
             self.btnDownloadScreenshot.show()
 
 
+    def _getPixmap(self, remoteAsset, kind, width, height):
+        # Pixmaps are cached already scaled to the size they are shown at, so that showing
+        # an asset again costs neither disk access nor decoding
+        key = (remoteAsset.getId(), kind, width, height)
+        pixmap = self.pixmapCache.get(key)
+        if pixmap is not None:
+            return pixmap
+
+        if kind == "thumb":
+            # Thumbnails are loaded from memory, since they may be in the thumbnail pack rather than in a file
+            data = self.assetdb.getThumbData(remoteAsset)
+            pixmap = QtGui.QPixmap()
+            if data is None or not pixmap.loadFromData(data):
+                return None
+            pixmap = pixmap.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        else:
+            path = remoteAsset.getScreenshotPath()
+            if path is None or path == "" or not os.path.exists(path):
+                return None
+            # Large images are decoded directly at the smaller size, which for jpeg is much
+            # faster than decoding at full size and scaling afterwards
+            reader = QtGui.QImageReader(os.path.abspath(path))
+            size = reader.size()
+            if size.isValid() and (size.width() > width or size.height() > height):
+                reader.setScaledSize(size.scaled(width, height, Qt.KeepAspectRatio))
+            image = reader.read()
+            if image.isNull():
+                return None
+            pixmap = QtGui.QPixmap.fromImage(image)
+
+        self.pixmapCache.put(key, pixmap)
+        return pixmap
+
+    def _showThumbnail(self, remoteAsset):
+        pixmap = self._getPixmap(remoteAsset, "thumb", THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        if pixmap is None:
+            self.thumbnail.setPixmap(QtGui.QPixmap(os.path.abspath(self.notfound)))
+            return False
+        self.thumbnail.setPixmap(pixmap)
+        return True
+
+    def _onIconLoaded(self, assetId):
+        if self.listModel is not None:
+            self.listModel.thumbnailLoaded(assetId)
+
+    def _onIconMissing(self, assetId):
+        if self.listModel is not None:
+            self.listModel.thumbnailMissing(assetId)
+        asset = self.assetdb.assetsById.get(assetId)
+        if asset is not None and asset.getThumbPath() is not None:
+            self.assetdb.requestVisibleThumbnail(asset)
+
+    def _onThumbnailReady(self, assetId):
+        self.pixmapCache.invalidate(assetId)
+        if self.listModel is not None:
+            # Makes the grid load the thumbnail again
+            self.listModel.thumbnailLoaded(assetId)
+        if self.currentlySelectedRemoteAsset is not None and self.currentlySelectedRemoteAsset.getId() == assetId:
+            self._showThumbnail(self.currentlySelectedRemoteAsset)
+
     def showMessage(self,message,title="Information"):
         self.msg = QMessageBox()
         self.msg.setIcon(QMessageBox.Information)
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+SQLite storage for the asset catalog and for the state of installed assets
+
+"""
+
+import gui3d
+import json
+import sqlite3
+import threading
+
+mhapi = gui3d.app.mhapi
+
+SCHEMA_VERSION = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS assets (
+    nid INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    author TEXT,
+    license TEXT,
+    category TEXT,
+    core_material INTEGER NOT NULL DEFAULT 0,
+    changed INTEGER,
+    created INTEGER,
+    title TEXT,
+    description TEXT,
+    install_path TEXT
+);
+CREATE INDEX IF NOT EXISTS assets_type ON assets (type);
+CREATE INDEX IF NOT EXISTS assets_author ON assets (type, author);
+CREATE INDEX IF NOT EXISTS assets_license ON assets (type, license);
+CREATE INDEX IF NOT EXISTS assets_category ON assets (type, category);
+CREATE INDEX IF NOT EXISTS assets_changed ON assets (type, changed);
+CREATE TABLE IF NOT EXISTS local_assets (
+    nid INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    file TEXT,
+    modified TEXT
+);
+CREATE INDEX IF NOT EXISTS local_assets_type ON local_assets (type);
+CREATE TABLE IF NOT EXISTS dir_cache (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    listing TEXT
+);
+CREATE TABLE IF NOT EXISTS thumb_pack (
+    nid INTEGER PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+'''
+
+
+class AssetStore():
+
+    def __init__(self, path):
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+        # Version 2 had no catalog table. The one created above is empty and has no
+        # remoteHash, so the catalog is stored again when it is next loaded.
+        if self.getMeta("schemaVersion") != str(SCHEMA_VERSION):
+            self.setMeta("schemaVersion", str(SCHEMA_VERSION))
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def getMeta(self, key, default=None):
+        with self._lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        return row[0]
+
+    def setMeta(self, key, value):
+        with self._lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def deleteMeta(self, key):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM meta WHERE key = ?", (key,))
+
+    def replaceRemoteAssets(self, remoteAssets, sourceHash):
+        """Replace the catalog with the given RemoteAsset objects, in one transaction. sourceHash
+        identifies the catalog, see getMeta("remoteHash")."""
+
+        rows = []
+        for asset in remoteAssets:
+            category = getattr(asset, "category", None)
+            coreMaterial = 0
+            if asset.type == "material":
+                btm = asset.belongs_to_metadata
+                if btm["belonging_is_assigned"] and "belongs_to_core_asset" in btm:
+                    coreMaterial = 1
+            rows.append((asset.nid, asset.type, asset.username, asset.license, category, coreMaterial, asset.changedTimestamp,
+                         asset.createdTimestamp, asset.title, asset.description, asset.getInstallPath()))
+
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM assets")
+            self.connection.executemany("INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('remoteHash', ?)", (sourceHash,))
+
+        self.log.debug("Stored number of catalog rows", len(rows))
+
+    def queryAssetIds(self, assetType, author=None, license=None, category=None, coreMaterial=None, changedAfter=None, newestFirst=False):
+        """Return the ids of the catalog assets matching the given criteria, with the filtering done by SQLite.
+        Assets without a change date always match changedAfter. Newest first puts them last."""
+
+        sql = "SELECT nid FROM assets WHERE type = ?"
+        args = [assetType]
+
+        if author is not None:
+            sql = sql + " AND author = ?"
+            args.append(author)
+
+        if license is not None:
+            sql = sql + " AND license = ?"
+            args.append(license)
+
+        if category is not None:
+            sql = sql + " AND category = ?"
+            args.append(category)
+
+        if coreMaterial:
+            sql = sql + " AND core_material = 1"
+
+        if changedAfter is not None:
+            sql = sql + " AND (changed IS NULL OR changed >= ?)"
+            args.append(changedAfter)
+
+        if newestFirst:
+            sql = sql + " ORDER BY changed IS NULL, changed DESC, nid"
+        else:
+            sql = sql + " ORDER BY nid"
+
+        with self._lock:
+            return [row[0] for row in self.connection.execute(sql, args)]
+
+    def hasLocalAssets(self):
+        return self.getMeta("localBuilt") == "1"
+
+    def getLocalAssets(self):
+        """Return the installed assets as a dict of asset type -> asset id -> { file, modified }."""
+
+        localAssets = {}
+        with self._lock:
+            for (nid, assetType, file, modified) in self.connection.execute("SELECT nid, type, file, modified FROM local_assets"):
+                localAssets.setdefault(assetType, {})[nid] = { "file": file, "modified": modified }
+        return localAssets
+
+    def replaceLocalAssets(self, localAssets):
+        """Replace all installed asset rows, in one transaction."""
+
+        rows = []
+        for assetType in localAssets:
+            for assetId in localAssets[assetType]:
+                info = localAssets[assetType][assetId]
+                rows.append((int(assetId), assetType, info.get("file"), info.get("modified")))
+
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM local_assets")
+            self.connection.executemany("INSERT OR REPLACE INTO local_assets VALUES (?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('localBuilt', '1')")
+
+    def upsertLocalAsset(self, assetType, assetId, file, modified):
+        with self._lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO local_assets VALUES (?, ?, ?, ?)", (int(assetId), assetType, file, modified))
+
+    def deleteLocalAsset(self, assetId):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM local_assets WHERE nid = ?", (int(assetId),))
+
+    def getDirCache(self):
+        """Return the cached directory listings as a dict of path -> (mtime, { name: file mtime or None for directories })."""
+
+        cache = {}
+        with self._lock:
+            for (path, mtime, listing) in self.connection.execute("SELECT path, mtime, listing FROM dir_cache"):
+                cache[path] = (mtime, json.loads(listing))
+        return cache
+
+    def upsertDirCache(self, cache):
+        rows = [(path, cache[path][0], json.dumps(cache[path][1])) for path in cache]
+        with self._lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO dir_cache VALUES (?, ?, ?)", rows)
+
+    def replaceDirCache(self, cache):
+        rows = [(path, cache[path][0], json.dumps(cache[path][1])) for path in cache]
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM dir_cache")
+            self.connection.executemany("INSERT OR REPLACE INTO dir_cache VALUES (?, ?, ?)", rows)
+
+    def getThumbPackIndex(self):
+        """Return the index of the packed thumbnails as a dict of asset id -> (offset, length)."""
+
+        index = {}
+        with self._lock:
+            for (nid, offset, length) in self.connection.execute("SELECT nid, offset, length FROM thumb_pack"):
+                index[nid] = (offset, length)
+        return index
+
+    def upsertThumbPackEntries(self, entries):
+        rows = [(int(assetId), entries[assetId][0], entries[assetId][1]) for assetId in entries]
+        with self._lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO thumb_pack VALUES (?, ?, ?)", rows)
+
+    def deleteThumbPackEntries(self, assetIds):
+        with self._lock, self.connection:
+            self.connection.executemany("DELETE FROM thumb_pack WHERE nid = ?", [(int(assetId),) for assetId in assetIds])
+
+    def replaceThumbPackIndex(self, index):
+        rows = [(int(assetId), index[assetId][0], index[assetId][1]) for assetId in index]
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM thumb_pack")
+            self.connection.executemany("INSERT OR REPLACE INTO thumb_pack VALUES (?, ?, ?)", rows)
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Watches the asset directories for changes made outside of the asset downloader
+
+"""
+
+import gui3d
+import os
+
+mhapi = gui3d.app.mhapi
+
+if mhapi.utility.isPython3():
+    from PyQt5.QtCore import *
+else:
+    if mhapi.utility.isPySideAvailable():
+        from PySide.QtCore import *
+    else:
+        from PyQt4.QtCore import *
+
+# Milliseconds to wait for more changes before updating the local DB
+SETTLE_DELAY = 500
+
+# Milliseconds between checks of directories which could not be watched
+POLL_INTERVAL = 5000
+
+
+class LocalAssetWatcher():
+
+    def __init__(self, assetdb):
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.assetdb = assetdb
+
+        # QFileSystemWatcher uses the native notification mechanism of the platform,
+        # such as inotify on linux
+        self.watcher = QFileSystemWatcher()
+        self.watcher.directoryChanged.connect(self._onDirectoryChanged)
+
+        self.watched = set()
+        self.polled = {}
+        self.pending = set()
+
+        self.settleTimer = QTimer()
+        self.settleTimer.setSingleShot(True)
+        self.settleTimer.timeout.connect(self._refreshPending)
+
+        self.pollTimer = QTimer()
+        self.pollTimer.timeout.connect(self._poll)
+
+    def watch(self, paths):
+        paths = [path for path in set(paths) if path not in self.watched and path not in self.polled and os.path.isdir(path)]
+        if not paths:
+            return
+
+        # Paths the native watcher cannot take (for example when the inotify watch limit
+        # has been reached) are instead checked for mtime changes on a timer
+        failed = self.watcher.addPaths(paths) or []
+        failed = [str(path) for path in failed]
+
+        for path in paths:
+            if path in failed:
+                self.polled[path] = self._getMtime(path)
+            else:
+                self.watched.add(path)
+
+        self.log.debug("Number of watched asset directories", len(self.watched))
+
+        if self.polled:
+            self.log.debug("Number of polled asset directories", len(self.polled))
+            if not self.pollTimer.isActive():
+                self.pollTimer.start(POLL_INTERVAL)
+
+    def stop(self):
+        self.settleTimer.stop()
+        self.pollTimer.stop()
+        if self.watched:
+            self.watcher.removePaths(list(self.watched))
+        self.watched = set()
+        self.polled = {}
+        self.pending = set()
+
+    def _getMtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _onDirectoryChanged(self, path):
+        self.log.trace("Directory changed", path)
+        self.pending.add(str(path))
+        self.settleTimer.start(SETTLE_DELAY)
+
+    def _poll(self):
+        for path in list(self.polled.keys()):
+            mtime = self._getMtime(path)
+            if mtime != self.polled[path]:
+                self.polled[path] = mtime
+                self.pending.add(path)
+        if self.pending:
+            self._refreshPending()
+
+    def _refreshPending(self):
+        pending = self.pending
+        self.pending = set()
+
+        assetDirs = []
+        for path in pending:
+            if not os.path.isdir(path):
+                # The directory itself is gone, so it can no longer be watched
+                self.watched.discard(path)
+                self.polled.pop(path, None)
+            assetDirs.extend(self.assetdb.refreshLocalDirectory(path))
+
+        # Asset directories are often created before the files are copied into them, so
+        # they are watched as soon as they appear rather than once they hold an asset
+        self.watch(assetDirs)
@@ -0,0 +1,218 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Keep-alive HTTP connections which are reused between downloads to the same host
+
+"""
+
+import gui3d
+import sys
+import ssl
+import socket
+import threading
+
+if sys.version_info >= (3, 0):
+    import http.client as httplib
+    from urllib.parse import urlsplit, urljoin
+    from urllib.error import HTTPError
+else:
+    import httplib
+    from urlparse import urlsplit, urljoin
+    from urllib2 import HTTPError
+
+mhapi = gui3d.app.mhapi
+
+MAX_IDLE_PER_HOST = 4
+MAX_REDIRECTS = 5
+TIMEOUT = 60
+
+# Errors which indicate that the server closed an idle keep-alive connection
+STALE_CONNECTION_ERRORS = (httplib.BadStatusLine, httplib.CannotSendRequest, socket.error)
+
+_sharedPool = None
+_sharedPoolLock = threading.Lock()
+
+
+def getConnectionPool():
+    """Return the connection pool shared by all download tasks."""
+    global _sharedPool
+    with _sharedPoolLock:
+        if _sharedPool is None:
+            _sharedPool = ConnectionPool()
+        return _sharedPool
+
+
+class PooledResponse():
+
+    def __init__(self, pool, key, connection, response, url):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+
+    def info(self):
+        return self.response.msg
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def read(self, amt=None):
+        data = self.response.read(amt)
+        if not data or self.response.isclosed():
+            self.close()
+        return data
+
+    def close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        self.connection = None
+        if self.response.isclosed() and not self.response.will_close:
+            self.pool._release(self.key, connection)
+        else:
+            self.response.close()
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ConnectionPool():
+
+    def __init__(self, maxIdlePerHost=MAX_IDLE_PER_HOST, timeout=TIMEOUT):
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.maxIdlePerHost = maxIdlePerHost
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._sslContext = None
+        self.created = 0
+        self.reused = 0
+
+    def getStats(self):
+        with self._lock:
+            return { "created": self.created, "reused": self.reused }
+
+    def urlopen(self, url, headers=None):
+        """Perform a GET request and return a PooledResponse. Redirects are followed. Error
+        statuses (400 and up) are raised as HTTPError, just like urlopen() would do."""
+
+        requestHeaders = { "User-Agent": "MakeHuman asset downloader", "Connection": "keep-alive" }
+        if headers:
+            requestHeaders.update(headers)
+
+        for redirect in range(MAX_REDIRECTS + 1):
+            (key, connection, response) = self._request(url, requestHeaders)
+            pooled = PooledResponse(self, key, connection, response, url)
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                location = urljoin(url, response.getheader("Location"))
+                self.log.debug("Following redirect to", location)
+                pooled.read()
+                pooled.close()
+                url = location
+                continue
+
+            if response.status >= 400:
+                pooled.read()
+                pooled.close()
+                raise HTTPError(url, response.status, response.reason, response.msg, None)
+
+            return pooled
+
+        raise HTTPError(url, 310, "Too many redirects", None, None)
+
+    def _request(self, url, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path = path + "?" + parts.query
+
+        connection = self._acquire(key)
+        reused = connection is not None
+
+        if not reused:
+            connection = self._connect(key)
+
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            connection.close()
+            if not reused:
+                raise
+            # The server dropped the idle connection, try again with a fresh one
+            self.log.debug("Kept-alive connection went stale, reconnecting to", parts.hostname)
+            connection = self._connect(key)
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            reused = False
+
+        if reused:
+            with self._lock:
+                self.reused = self.reused + 1
+
+        return (key, connection, response)
+
+    def _connect(self, key):
+        (scheme, host, port) = key
+        self.log.debug("Opening new connection to", host)
+        with self._lock:
+            self.created = self.created + 1
+        if scheme == "https":
+            if self._sslContext is None:
+                self._sslContext = ssl.create_default_context()
+            return httplib.HTTPSConnection(host, port, timeout=self.timeout, context=self._sslContext)
+        return httplib.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def _release(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxIdlePerHost:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def closeAll(self):
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
@@ -21,18 +21,24 @@ import mh
 import socket
 import json
 import os
-import time
+import re
 import sys
-import io
 import urllib
+import threading
 
-from progress import Progress
+from .connectionpool import getConnectionPool
+from .fileutil import replaceFile
+from .workerpool import WorkerPoolThread, WorkerPoolTask
 
 mhapi = gui3d.app.mhapi
 
 qtSignal = None
 qtSlot = None
 
+DEFAULT_WORKERS = 6
+DEFAULT_CONNECTIONS_PER_HOST = 4
+CHUNK_SIZE = 64 * 1024
+
 if mhapi.utility.isPython3():
     from PyQt5 import QtGui
     from PyQt5 import QtCore
@@ -59,171 +65,316 @@ else:
         qtSlot = QtCore.pyqtSlot
 
 
-class DownloadThread(QThread):
+def openUrl(remote, headers=None, request=None, pool=None):
+    """Open a remote url for reading, with the shared connection pool unless a proxy is configured."""
+    if request is None:
+        request = mhapi.utility.getCompatibleUrlFetcher()
+    if pool is None:
+        pool = getConnectionPool()
+    # Proxy settings are only understood by the stock url fetcher, so only use
+    # the kept-alive connections when talking directly to the server
+    scheme = remote.split(":", 1)[0].lower()
+    if scheme in request.getproxies():
+        return request.urlopen(request.Request(remote, headers=headers or {}))
+    return pool.urlopen(remote, headers)
+
 
-    signalProgress = qtSignal(float)
-    signalFinished = qtSignal(str)
+class DownloadThread(WorkerPoolThread):
 
-    def __init__(self, downloadTuples, parent = None, overrideProgressSteps=None):
-        QThread.__init__(self, parent)
-        self.log = mhapi.utility.getLogChannel("assetdownload")
-        self.exiting = False
+    def __init__(self, downloadTuples, parent = None, overrideProgressSteps=None, maxWorkers=None, maxConnectionsPerHost=None):
+        WorkerPoolThread.__init__(self, parent, maxWorkers if maxWorkers else DEFAULT_WORKERS)
         self.downloadTuples = downloadTuples
         self.log.debug("Downloadtuples length:",len(downloadTuples))
         self.request = mhapi.utility.getCompatibleUrlFetcher()
+        self.pool = getConnectionPool()
         self.overrideProgressSteps = overrideProgressSteps
 
+        self.maxConnectionsPerHost = maxConnectionsPerHost if maxConnectionsPerHost else DEFAULT_CONNECTIONS_PER_HOST
+
+        self._hostLimits = {}
+        self._partial = {}
+        self._completed = 0
+        self._downloadStatus = "OK"
+        self.notModified = []
+
     def run(self):
         self.log.trace("Enter")
         self.onProgress(0.0)
 
-        total = len(self.downloadTuples)
-        current = 0
+        self._completed = 0
+        self._partial = {}
+        self._downloadStatus = "OK"
+        self.notModified = []
 
-        lastReport = time.time()
+        statsBefore = self.pool.getStats()
 
-        downloadStatus = "OK"
+        self.runWorkers(self.downloadTuples)
 
-        for dt in self.downloadTuples:
-            remote = dt[0]
-            local = dt[1]
-            dn = os.path.dirname(local)
-            if not os.path.exists(dn):
-                os.makedirs(dn)
-            current = current + 1
-            self.log.trace("About to download", remote)
-            self.log.trace("Destination is", local)
+        statsAfter = self.pool.getStats()
+        self.log.debug("Connections opened during download", statsAfter["created"] - statsBefore["created"])
+        self.log.debug("Connections reused during download", statsAfter["reused"] - statsBefore["reused"])
 
-            remote = remote.replace(" ", "%20")
+        self.onFinished(self._downloadStatus)
+        self.exiting = True
 
-            try:
-                requrl = self.request.urlopen(remote)
-                cl = requrl.info().get('Content-Length').strip()
-                self.log.debug("Content length", cl)
-
-                megabytes = 0
-
-                if cl:
-                    if mhapi.utility.isPy3 and str(cl).isnumeric():
-                        megabytes = float(cl) / 1000000.0
-                    if not mhapi.utility.isPy3 and unicode(cl).isnumeric():
-                        megabytes = float(cl) / 1000000.0
-
-                self.log.debug("Content megabytes", megabytes)
-
-                if megabytes < 1.0:
-                    self.log.debug("File to be downloaded in one chunk, size is less than one meg")
-                    data = requrl.read()
-                    with open(local,"wb") as f:
-                        f.write(data)
-                        self.log.debug("Successfully downloaded",remote)
-                else:
-                    # Very large file
-                    self.log.info("File to be downloaded in chunks, size is", megabytes)
-                    buf = io.BytesIO()
-                    size = 0
-                    megabytes = int(int(cl) / 1000000) + 1
-                    while True:
-                        buf1 = requrl.read(100 * 1000) # 100kb size blocks
-                        if not buf1:
-                            break
-                        buf.write(buf1)
-                        size += len(buf1)
-                        self.log.spam("Downloaded buffer size",size)
-                        sizemegs = int(size / 1000000)
-
-                        now = time.time()
-                        now = now - 0.5
-                        if now > lastReport:
-                            lastReport = now
-                            fileProgress = float(sizemegs) / float(megabytes)
-                            fileProgress = float(current - 1) + fileProgress
-                            if self.overrideProgressSteps is None:
-                                self.onProgress(float(fileProgress) / float(total))
-                            else:
-                                self.onProgress(float(fileProgress) / float(self.overrideProgressSteps))
-                    with open(local,"wb") as f:
-                        f.write(buf.getvalue())
-                        self.log.debug("Successfully downloaded",remote)
+    def keepWorking(self):
+        # An http error stops the remaining downloads, as when downloading one file at a time
+        with self._lock:
+            return not self.exiting and self._downloadStatus == "OK"
+
+    def processItem(self, dt, context):
+        remote = dt[0]
+        local = dt[1]
+        conditional = len(dt) > 2 and dt[2].get("conditional", False)
 
+        remote = remote.replace(" ", "%20")
+
+        hostLimit = self._getHostLimit(remote)
+
+        with hostLimit:
+            try:
+                self._downloadFile(remote, local, conditional)
             except urllib.error.HTTPError as e:
                 self.log.error("Caught http error", e)
-                downloadStatus = str(e.code) + ";" + remote
-                break
+                with self._lock:
+                    if self._downloadStatus == "OK":
+                        self._downloadStatus = str(e.code) + ";" + remote
             except:
                 self.log.error("Exception in download",sys.exc_info())
                 self.log.warn("Could not download",remote)
 
-            now = time.time()
-            now = now - 0.5
-            if now > lastReport:
-                lastReport = now
-                if self.overrideProgressSteps is None:
-                    self.onProgress(float(current) / float(total))
+        with self._lock:
+            self._partial.pop(local, None)
+            self._completed = self._completed + 1
+
+    def _getHostLimit(self, remote):
+        host = remote.split("/")[2] if "://" in remote else ""
+        with self._lock:
+            if host not in self._hostLimits:
+                self._hostLimits[host] = threading.BoundedSemaphore(self.maxConnectionsPerHost)
+            return self._hostLimits[host]
+
+    def _downloadFile(self, remote, local, conditional=False):
+        dn = os.path.dirname(local)
+        if not os.path.exists(dn):
+            try:
+                os.makedirs(dn)
+            except OSError:
+                # Another worker may have created it in the meantime
+                if not os.path.isdir(dn):
+                    raise
+
+        self.log.trace("About to download", remote)
+        self.log.trace("Destination is", local)
+
+        # The body is streamed to a temporary file next to the destination, so that memory use does
+        # not depend on the file size and so that a half-written file never ends up at the final path.
+        # If the transfer is interrupted, the .part file is kept together with a sidecar describing
+        # what it is a part of, so that the next attempt can continue where this one stopped.
+        tmp = local + ".part"
+        sidecar = tmp + ".json"
+
+        # For conditional downloads, the validators of the copy we already have are sent
+        # along, so that the server can answer "304 Not Modified" instead of sending the file
+        validatorsFile = local + ".validators"
+        headers = {}
+        if conditional:
+            headers = self._readValidators(local, validatorsFile)
+
+        offset = 0
+        resumeInfo = self._readResumeInfo(remote, tmp, sidecar)
+        if resumeInfo is not None:
+            offset = os.path.getsize(tmp)
+            headers["Range"] = "bytes=" + str(offset) + "-"
+            headers["If-Range"] = resumeInfo["validator"]
+            self.log.debug("Resuming download at byte", offset)
+        else:
+            self._discardPartial(tmp, sidecar)
+
+        try:
+            requrl = self._open(remote, headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                self._markNotModified(remote, local)
+                return
+            if e.code != 416 or offset == 0:
+                raise
+            self.log.debug("Server refused to resume download, starting over", remote)
+            self._discardPartial(tmp, sidecar)
+            offset = 0
+            requrl = self._open(remote)
+
+        try:
+            if requrl.getcode() == 304:
+                self._markNotModified(remote, local)
+                return
+
+            cl = (requrl.info().get('Content-Length') or "").strip()
+            self.log.debug("Content length", cl)
+
+            remaining = 0
+
+            if cl:
+                if mhapi.utility.isPy3 and str(cl).isnumeric():
+                    remaining = int(cl)
+                if not mhapi.utility.isPy3 and unicode(cl).isnumeric():
+                    remaining = int(cl)
+
+            if offset > 0:
+                if requrl.getcode() == 206 and self._getRangeStart(requrl) == offset:
+                    self.log.debug("Server accepted range request for", remote)
                 else:
-                    self.onProgress(float(current) / float(self.overrideProgressSteps))
+                    # The server ignored the range, or the file changed since the partial download
+                    self.log.debug("Server ignored range request, fetching full file", remote)
+                    offset = 0
 
-        self.onFinished(downloadStatus)
-        self.exiting = True
+            expected = offset + remaining
 
-    def onProgress(self, prog = 0.0):
-        self.log.trace("onProgress",prog)
-        self.signalProgress.emit(prog)
+            self.log.debug("Content megabytes", float(expected) / 1000000.0)
 
-    def onFinished(self, status = "OK"):
-        self.log.trace("Enter")
-        self.signalFinished.emit(status)
+            if offset == 0:
+                self._writeResumeInfo(requrl, remote, expected, sidecar)
+
+            size = offset
+            try:
+                with open(tmp, "ab" if offset > 0 else "wb") as f:
+                    while not self.exiting:
+                        buf = requrl.read(CHUNK_SIZE)
+                        if not buf:
+                            break
+                        f.write(buf)
+                        size += len(buf)
+                        self.log.spam("Downloaded size",size)
+                        if expected > 0:
+                            with self._lock:
+                                self._partial[local] = min(float(size) / float(expected), 1.0)
+                            self.reportProgress()
+                if self.exiting:
+                    raise IOError("Download was aborted")
+                if expected > 0 and size < expected:
+                    raise IOError("Download was truncated after " + str(size) + " of " + str(expected) + " bytes")
+                replaceFile(tmp, local)
+            except:
+                if not os.path.exists(sidecar):
+                    self._discardPartial(tmp, sidecar)
+                else:
+                    self.log.debug("Keeping partial download for later resume", tmp)
+                raise
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+            if conditional:
+                self._writeValidators(requrl, validatorsFile)
+            self.log.debug("Successfully downloaded",remote)
+        finally:
+            requrl.close()
+
+    def _markNotModified(self, remote, local):
+        self.log.debug("Not modified since last download", remote)
+        with self._lock:
+            self.notModified.append(local)
+
+    def _readValidators(self, local, validatorsFile):
+        headers = {}
+        if not os.path.exists(local) or not os.path.exists(validatorsFile):
+            return headers
+        try:
+            with open(validatorsFile, "r") as f:
+                validators = json.load(f)
+        except:
+            self.log.warn("Could not read validators", validatorsFile)
+            return headers
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("lastModified"):
+            headers["If-Modified-Since"] = validators["lastModified"]
+        return headers
+
+    def _writeValidators(self, requrl, validatorsFile):
+        headers = requrl.info()
+        validators = { "etag": headers.get("ETag"), "lastModified": headers.get("Last-Modified") }
+        if validators["etag"] or validators["lastModified"]:
+            with open(validatorsFile, "w") as f:
+                json.dump(validators, f)
+        elif os.path.exists(validatorsFile):
+            os.remove(validatorsFile)
+
+    def _readResumeInfo(self, remote, tmp, sidecar):
+        if not os.path.exists(tmp) or not os.path.exists(sidecar):
+            return None
+        try:
+            with open(sidecar, "r") as f:
+                info = json.load(f)
+        except:
+            self.log.warn("Could not read resume information", sidecar)
+            return None
+        if info.get("url") != remote or not info.get("validator"):
+            return None
+        if os.path.getsize(tmp) >= info.get("length", 0):
+            return None
+        return info
+
+    def _writeResumeInfo(self, requrl, remote, expected, sidecar):
+        # A partial file can only be safely resumed if the server gives us a validator to
+        # send in If-Range, since otherwise we might glue together two different versions
+        headers = requrl.info()
+        validator = headers.get("ETag") or headers.get("Last-Modified")
+        acceptsRanges = (headers.get("Accept-Ranges") or "").strip().lower() == "bytes"
+        if expected > 0 and validator and acceptsRanges:
+            with open(sidecar, "w") as f:
+                json.dump({ "url": remote, "length": expected, "validator": validator }, f)
+        elif os.path.exists(sidecar):
+            os.remove(sidecar)
+
+    def _getRangeStart(self, requrl):
+        contentRange = requrl.info().get("Content-Range") or ""
+        match = re.match(r"\s*bytes\s+(\d+)-", contentRange)
+        if match is None:
+            return None
+        return int(match.group(1))
+
+    def _discardPartial(self, tmp, sidecar):
+        for fn in [tmp, sidecar]:
+            if os.path.exists(fn):
+                os.remove(fn)
+
+    def _open(self, remote, headers=None):
+        return openUrl(remote, headers, self.request, self.pool)
+
+    def getProgress(self):
+        fileProgress = float(self._completed) + sum(self._partial.values())
+
+        if self.overrideProgressSteps is None:
+            return fileProgress / float(max(len(self.downloadTuples), 1))
+        return fileProgress / float(self.overrideProgressSteps)
 
     def __del__(self):
-        self.log.trace("Enter")
-        self.exiting = True
-        self.log = None
+        WorkerPoolThread.__del__(self)
         self.downloadTuples = None
         self.request = None
+        self.pool = None
 
 
-class DownloadTask():
+class DownloadTask(WorkerPoolTask):
 
-    def __init__(self, parentWidget, downloadTuples, onFinished=None, onProgress=None, overrideProgressSteps=None):
-        self.log = mhapi.utility.getLogChannel("assetdownload")
+    def __init__(self, parentWidget, downloadTuples, onFinished=None, onProgress=None, overrideProgressSteps=None, maxWorkers=None, maxConnectionsPerHost=None):
+        downloadThread = DownloadThread(downloadTuples, overrideProgressSteps = overrideProgressSteps, maxWorkers=maxWorkers, maxConnectionsPerHost=maxConnectionsPerHost)
+        WorkerPoolTask.__init__(self, downloadThread, "Downloading files...", onProgress)
 
         self.parentWidget = parentWidget
         self.onFinished = onFinished
-        self.onProgress = onProgress
         self.overrideProgressSteps = overrideProgressSteps
-
-        self.downloadThread = DownloadThread(downloadTuples, overrideProgressSteps = self.overrideProgressSteps)
-
-        self.downloadThread.signalProgress.connect(self._onProgress)
-        self.downloadThread.signalFinished.connect(self._onFinished)
-
-        self.progress = Progress()
+        self.notModified = []
 
         self.log.debug("About to start downloading")
         self.log.spam("downloadTuples",downloadTuples)
 
-        self.downloadThread.start()
-
-    def _onProgress(self, prog=0.0):
-        self.log.trace("_onProgress",prog)
-
-        self.progress(prog,desc="Downloading files...")
-
-        if self.onProgress is not None:
-            self.log.trace("onProgress callback is defined")
-            self.onProgress(prog)
-        else:
-            self.log.trace("onProgress callback is not defined")
-
-    def _onFinished(self, status = "OK"):
-        self.log.trace("Enter")
-        self.log.debug("Status", status)
+        self.start()
 
+    def finished(self, downloadThread, status):
         if self.overrideProgressSteps is None:
             self.progress(1.0)
 
-        self.downloadThread.signalProgress.disconnect(self._onProgress)
-        self.downloadThread.signalFinished.disconnect(self._onFinished)
+        self.notModified = list(downloadThread.notModified)
 
         if self.onFinished is not None:
             self.log.trace("onFinished callback is defined")
@@ -237,5 +388,3 @@ class DownloadTask():
 
         else:
             self.log.trace("onFinished callback is not defined")
-
-        self.downloadThread = None
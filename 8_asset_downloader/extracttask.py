@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Extracts zip files in a background thread, skipping members which are already on disk
+
+"""
+
+import gui3d
+import os
+import sys
+import zlib
+
+from zipfile import ZipFile
+
+from .fileutil import replaceFile
+from .workerpool import WorkerPoolThread, WorkerPoolTask
+
+mhapi = gui3d.app.mhapi
+
+DEFAULT_WORKERS = 4
+CHUNK_SIZE = 64 * 1024
+
+
+def _fileMatches(path, member):
+    """Check if the file at path already has the size and CRC of the zip member."""
+    try:
+        if os.path.getsize(path) != member.file_size:
+            return False
+        crc = 0
+        with open(path, "rb") as f:
+            while True:
+                buf = f.read(CHUNK_SIZE)
+                if not buf:
+                    break
+                crc = zlib.crc32(buf, crc)
+        return (crc & 0xffffffff) == member.CRC
+    except (IOError, OSError):
+        return False
+
+
+class ExtractThread(WorkerPoolThread):
+
+    def __init__(self, zipFiles, destination, parent = None, maxWorkers=None, includeDirs=None):
+        WorkerPoolThread.__init__(self, parent, maxWorkers if maxWorkers else DEFAULT_WORKERS)
+        self.zipFiles = zipFiles
+        self.destination = os.path.abspath(destination)
+        self.includeDirs = includeDirs
+
+        self._total = 0
+        self._completed = 0
+        self._skipped = 0
+        self._failed = 0
+
+    def run(self):
+        self.log.trace("Enter")
+        self.onProgress(0.0)
+
+        members = []
+        excluded = 0
+
+        for zipFile in self.zipFiles:
+            try:
+                with ZipFile(zipFile, 'r') as zf:
+                    for member in zf.infolist():
+                        if member.filename.endswith("/"):
+                            continue
+                        if self.includeDirs is not None and member.filename.split("/")[0] not in self.includeDirs:
+                            excluded = excluded + 1
+                            continue
+                        members.append((zipFile, member))
+            except:
+                self.log.error("Could not read zip file", zipFile, sys.exc_info())
+
+        self._total = len(members)
+        self.log.debug("Number of zip members to extract", self._total)
+        self.log.debug("Number of zip members outside of the included directories", excluded)
+
+        self.runWorkers(members)
+
+        self.log.debug("Zip members skipped since they were already on disk", self._skipped)
+        self.log.debug("Zip members which could not be extracted", self._failed)
+
+        self.onFinished("OK")
+        self.exiting = True
+
+    def processItem(self, item, handles):
+        # Each worker has its own handles for the zip files, since reading
+        # members concurrently through one handle is not safe
+        (zipFile, member) = item
+        try:
+            if zipFile not in handles:
+                handles[zipFile] = ZipFile(zipFile, 'r')
+            self._extractMember(handles[zipFile], member)
+        except:
+            self.log.error("Exception when extracting", member.filename, sys.exc_info())
+            with self._lock:
+                self._failed = self._failed + 1
+
+        with self._lock:
+            self._completed = self._completed + 1
+
+    def finishWorker(self, handles):
+        for zf in handles.values():
+            zf.close()
+
+    def _extractMember(self, zf, member):
+        target = os.path.normpath(os.path.join(self.destination, member.filename))
+        if not target.startswith(self.destination + os.sep):
+            self.log.warn("Refusing to extract outside of destination", member.filename)
+            return
+
+        if _fileMatches(target, member):
+            self.log.spam("Already extracted", target)
+            with self._lock:
+                self._skipped = self._skipped + 1
+            return
+
+        dn = os.path.dirname(target)
+        if not os.path.exists(dn):
+            try:
+                os.makedirs(dn)
+            except OSError:
+                # Another worker may have created it in the meantime
+                if not os.path.isdir(dn):
+                    raise
+
+        tmp = target + ".part"
+        try:
+            with zf.open(member) as src, open(tmp, "wb") as dest:
+                while True:
+                    buf = src.read(CHUNK_SIZE)
+                    if not buf:
+                        break
+                    dest.write(buf)
+            replaceFile(tmp, target)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def getProgress(self):
+        return float(self._completed) / float(max(self._total, 1))
+
+    def __del__(self):
+        WorkerPoolThread.__del__(self)
+        self.zipFiles = None
+
+
+class ExtractTask(WorkerPoolTask):
+
+    def __init__(self, parentWidget, zipFiles, destination, onFinished=None, onProgress=None, maxWorkers=None, includeDirs=None):
+        extractThread = ExtractThread(zipFiles, destination, maxWorkers=maxWorkers, includeDirs=includeDirs)
+        WorkerPoolTask.__init__(self, extractThread, "Unzipping seed zips", onProgress)
+
+        self.parentWidget = parentWidget
+        self.onFinished = onFinished
+
+        self.log.debug("About to start extracting", zipFiles)
+
+        self.start()
+
+    def finished(self, extractThread, status):
+        self.progress(1.0)
+
+        if self.onFinished is not None:
+            self.onFinished()
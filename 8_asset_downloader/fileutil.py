@@ -0,0 +1,35 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+File system helpers shared by the downloader, the extractor and the thumbnail code
+
+"""
+
+import os
+
+
+def replaceFile(src, dest):
+    """Move src to dest, replacing dest if it exists. os.replace() does this atomically, but is
+    missing on python 2, where dest is removed first."""
+    if hasattr(os, "replace"):
+        os.replace(src, dest)
+    else:
+        if os.path.exists(dest):
+            os.remove(dest)
+        os.rename(src, dest)
@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+List model for showing filtered assets as a grid of thumbnails
+
+"""
+
+import gui3d
+import sys
+
+from .tablemodel import updateRows
+
+mhapi = gui3d.app.mhapi
+
+qtSignal = None
+
+if mhapi.utility.isPython3():
+    from PyQt5 import QtGui
+    from PyQt5 import QtCore
+    from PyQt5.QtCore import *
+    qtSignal = QtCore.pyqtSignal
+else:
+    if mhapi.utility.isPySideAvailable():
+        from PySide import QtGui
+        from PySide import QtCore
+        from PySide.QtCore import *
+        qtSignal = QtCore.Signal
+    else:
+        from PyQt4 import QtGui
+        from PyQt4 import QtCore
+        from PyQt4.QtCore import *
+        qtSignal = QtCore.pyqtSignal
+
+ICON_SIZE = 96
+
+# Number of rows made available to the view at a time
+PAGE_SIZE = 200
+
+MAX_LOADER_THREADS = 3
+
+
+class AssetListModel(QAbstractListModel):
+
+    def __init__(self, assets, loader, pixmapCache, placeholder=None, parent=None):
+        """The model keeps references to the given RemoteAsset objects rather than copies of their fields.
+        Thumbnails are only loaded when the view asks for them, which it only does for visible rows."""
+
+        QAbstractListModel.__init__(self, parent)
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+
+        self.assets = assets
+        self.loader = loader
+        self.pixmapCache = pixmapCache
+        self.placeholder = placeholder
+        self.missing = set()
+
+        # The rows are the first assets of the list, more are added as the view scrolls down
+        self._shown = []
+        self._rows = {}
+
+    def setAssets(self, assets):
+        """Change the list of assets in place, with row removes and inserts rather than a reset, so
+        that the view keeps its scroll position. As many rows are shown as before, or one page."""
+
+        self.assets = assets
+        count = min(len(assets), max(len(self._shown), PAGE_SIZE))
+        updateRows(self, [self._shown], [assets[:count]], lambda asset: asset.getId())
+        self._rows = {}
+        for (row, asset) in enumerate(self._shown):
+            self._rows[asset.getId()] = row
+
+        # Thumbnail requests are dropped when the assets change, so shown rows which are still
+        # waiting for a thumbnail ask for it again
+        missing = self.missing
+        self.missing = set()
+        for assetId in missing:
+            self._emitChanged(assetId)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._shown)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return len(self._shown) < len(self.assets)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        loaded = len(self._shown)
+        count = min(PAGE_SIZE, len(self.assets) - loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), loaded, loaded + count - 1)
+        for row in range(loaded, loaded + count):
+            self._rows[self.assets[row].getId()] = row
+        self._shown.extend(self.assets[loaded:loaded + count])
+        self.endInsertRows()
+
+    def getAsset(self, row):
+        if row < 0 or row >= len(self._shown):
+            return None
+        return self._shown[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._shown):
+            return None
+
+        asset = self._shown[index.row()]
+
+        if role == Qt.DisplayRole:
+            if mhapi.utility.isPython3():
+                return asset.getTitle()
+            else:
+                return QString(asset.getTitle())
+
+        if role == Qt.ToolTipRole:
+            return asset.getTitle() + "\n" + asset.getAuthor() + ", " + asset.getLicense()
+
+        if role == Qt.DecorationRole:
+            assetId = asset.getId()
+            pixmap = self.pixmapCache.get((assetId, "icon", ICON_SIZE, ICON_SIZE))
+            if pixmap is not None:
+                return pixmap
+            if assetId not in self.missing:
+                self.loader.load(asset)
+            return self.placeholder
+
+        return None
+
+    def thumbnailLoaded(self, assetId):
+        self.missing.discard(assetId)
+        self._emitChanged(assetId)
+
+    def thumbnailMissing(self, assetId):
+        # Not asked for again until thumbnailLoaded() is called for it, or the view
+        # would keep trying to load it on every repaint
+        self.missing.add(assetId)
+
+    def _emitChanged(self, assetId):
+        row = self._rows.get(assetId)
+        if row is not None:
+            index = self.index(row, 0)
+            self.dataChanged.emit(index, index)
+
+
+class ThumbnailLoader(QObject):
+
+    signalLoaded = qtSignal(int)
+    signalMissing = qtSignal(int)
+
+    _signalDecoded = qtSignal(int, object)
+
+    def __init__(self, assetdb, pixmapCache):
+        QObject.__init__(self)
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.assetdb = assetdb
+        self.pixmapCache = pixmapCache
+        self.pending = set()
+
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(MAX_LOADER_THREADS)
+
+        self._signalDecoded.connect(self._onDecoded)
+
+    def load(self, asset):
+        """Read and decode the thumbnail of the asset on the thread pool. Pixmaps can only be made on
+        the main thread, so decoding is done to a QImage which is turned into a pixmap afterwards."""
+
+        assetId = asset.getId()
+        if assetId in self.pending:
+            return
+        self.pending.add(assetId)
+        self.pool.start(_LoadThumbnailTask(self, asset))
+
+    def cancel(self):
+        """Drop the thumbnails which have not started loading yet."""
+        self.pool.clear()
+        self.pending = set()
+
+    def _onDecoded(self, assetId, image):
+        self.pending.discard(assetId)
+        if image is None:
+            self.signalMissing.emit(assetId)
+            return
+        self.pixmapCache.put((assetId, "icon", ICON_SIZE, ICON_SIZE), QtGui.QPixmap.fromImage(image))
+        self.signalLoaded.emit(assetId)
+
+
+class _LoadThumbnailTask(QRunnable):
+
+    def __init__(self, loader, asset):
+        QRunnable.__init__(self)
+        self.loader = loader
+        self.asset = asset
+
+    def run(self):
+        image = None
+        try:
+            data = self.loader.assetdb.getThumbData(self.asset)
+            if data is not None:
+                image = QtGui.QImage()
+                if image.loadFromData(data):
+                    image = image.scaled(ICON_SIZE, ICON_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                else:
+                    image = None
+        except:
+            self.loader.log.warn("Could not load thumbnail", self.asset.getId(), sys.exc_info()[1])
+            image = None
+        self.loader._signalDecoded.emit(self.asset.getId(), image)
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Least recently used cache of decoded and scaled pixmaps, bounded by memory use
+
+"""
+
+import gui3d
+
+from collections import OrderedDict
+
+mhapi = gui3d.app.mhapi
+
+DEFAULT_MEGABYTES = 64
+
+
+class PixmapCache():
+
+    def __init__(self, maxBytes=DEFAULT_MEGABYTES * 1024 * 1024):
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.maxBytes = maxBytes
+        self.usedBytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached pixmap for the key, or None. The entry becomes the most recently used."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._entries[key] = entry
+        return entry[0]
+
+    def put(self, key, pixmap):
+        self.remove(key)
+        cost = self._getCost(pixmap)
+        if cost > self.maxBytes:
+            return
+        self._entries[key] = (pixmap, cost)
+        self.usedBytes = self.usedBytes + cost
+        self._evict()
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.usedBytes = self.usedBytes - entry[1]
+
+    def invalidate(self, assetId):
+        """Remove all cached pixmaps of the given asset. Keys are tuples which start with the asset id."""
+        for key in [key for key in self._entries if key[0] == assetId]:
+            self.remove(key)
+
+    def clear(self):
+        self._entries = OrderedDict()
+        self.usedBytes = 0
+
+    def setMaxBytes(self, maxBytes):
+        self.maxBytes = maxBytes
+        self._evict()
+
+    def _evict(self):
+        while self.usedBytes > self.maxBytes and self._entries:
+            (key, entry) = self._entries.popitem(last=False)
+            self.usedBytes = self.usedBytes - entry[1]
+            self.log.spam("Evicted pixmap", key)
+
+    def _getCost(self, pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
@@ -28,7 +28,7 @@ import json
 import os
 import re
 import platform
-import calendar, datetime
+import calendar, datetime, time
 
 from progress import Progress
 
@@ -55,6 +55,36 @@ fileForType["expression"] = "mhpose"
 fileForType["rig"] = "mhskel"
 fileForType["target"] = "file"
 
+# Clothes in these categories are listed as asset types of their own
+CLOTHES_CATEGORY_TYPES = ["eyebrows", "eyelashes", "teeth", "hair"]
+
+# The attributes which are stored in the remote DB snapshot
+SNAPSHOT_FIELDS = [
+    "type", "license", "title", "description", "username", "uid", "nid", "changed", "created",
+    "changedTimestamp", "createdTimestamp",
+    "category", "belongs_to_metadata", "root", "remoteFiles", "localFiles", "cachedDestination"
+]
+
+
+def parseTimestamp(value):
+    """Convert a date string from the asset DB to seconds since the epoch, or None if it cannot be parsed."""
+    if not value:
+        return None
+    try:
+        return calendar.timegm(time.strptime(value, '%Y-%m-%d %H:%M:%S'))
+    except ValueError:
+        return None
+
+
+def getAssetType(json):
+    """Return the type an asset in the remote json will have once parsed, without parsing it."""
+    assetType = json.get("type", "unknown")
+    if assetType == "clothes":
+        category = json.get("category", "").lower()
+        if category in CLOTHES_CATEGORY_TYPES:
+            return category
+    return assetType
+
 
 class RemoteAsset():
 
@@ -74,12 +104,34 @@ class RemoteAsset():
         if self.type == "material":
             self._parseMaterials()
 
+        # The directory is created by whoever first writes a file into it, so that
+        # parsing the remote DB does not cost a syscall per asset
         self.root = os.path.join(self.parent.root,str(self.nid))
-        if not os.path.exists(self.root):
-            os.makedirs(self.root)
 
         self._parseFiles()
 
+    @classmethod
+    def fromSnapshot(cls, parent, snapshot, assetdb=None):
+        """Recreate an asset from the output of getSnapshot(), without parsing json or touching the disk."""
+        asset = cls.__new__(cls)
+        asset.assetdb = assetdb
+        asset.parent = parent
+        asset.rawJson = None
+        asset.log = mhapi.utility.getLogChannel("assetdownload")
+        for field in SNAPSHOT_FIELDS:
+            if field in snapshot:
+                setattr(asset, field, snapshot[field])
+        return asset
+
+    def getSnapshot(self):
+        """Return the parsed fields of the asset, with the install path resolved, as plain data."""
+        self.getInstallPath()
+        snapshot = {}
+        for field in SNAPSHOT_FIELDS:
+            if hasattr(self, field):
+                snapshot[field] = getattr(self, field)
+        return snapshot
+
     def _getJsonKey(self,name,default):
 
         self.log.spam("Enter")
@@ -102,22 +154,15 @@ class RemoteAsset():
         self.nid = self._getJsonKey("nid",-1)
         self.changed = self._getJsonKey("changed",None)
         self.created = self._getJsonKey("created",None)
+        self.changedTimestamp = parseTimestamp(self.changed)
+        self.createdTimestamp = parseTimestamp(self.created)
 
     def _parseClothes(self):
 
         self.category = self._getJsonKey("category", "").lower()
 
-        if self.category == "eyebrows":
-            self.type = "eyebrows"
-
-        if self.category == "eyelashes":
-            self.type = "eyelashes"
-
-        if self.category == "teeth":
-            self.type = "teeth"
-
-        if self.category == "hair":
-            self.type = "hair"
+        if self.category in CLOTHES_CATEGORY_TYPES:
+            self.type = self.category
 
     def _parseMaterials(self):
 
@@ -186,12 +231,10 @@ class RemoteAsset():
             extension = extension.lower()
 
             if name == "screenshot":
-                convertedScreenshot = os.path.join(self.root, "screenshot.jpg")
-                if os.path.exists(convertedScreenshot):
-                    self.localFiles[name] = convertedScreenshot
-                else:
-                    fn = "screenshot" + extension
-                    self.localFiles[name] = os.path.join(self.root, fn)
+                # This is where the screenshot is downloaded to. The converted copy has a name of
+                # its own, see getScreenshotPath()
+                fn = "screenshot" + extension
+                self.localFiles[name] = os.path.join(self.root, fn)
 
             if name == "thumb":
                 fn = "thumb.png"
@@ -242,6 +285,14 @@ class RemoteAsset():
         self.log.trace("Enter")
         return self.created
 
+    def getChangedTimestamp(self):
+        self.log.trace("Enter")
+        return self.changedTimestamp
+
+    def getCreatedTimestamp(self):
+        self.log.trace("Enter")
+        return self.createdTimestamp
+
     def getLicense(self):
         self.log.trace("Enter")
         return self.license
@@ -263,10 +314,20 @@ class RemoteAsset():
     def getScreenshotPath(self):
         self.log.trace("Enter")
         if "screenshot" in self.localFiles:
+            # Which of the files exists is only checked when the screenshot is shown, since the
+            # downloaded file is replaced by the converted one some time after it arrives
+            converted = self.getConvertedScreenshotPath()
+            if os.path.exists(converted):
+                return converted
             return self.localFiles["screenshot"]
         else:
             return None
 
+    def getConvertedScreenshotPath(self):
+        # Never the name of a downloaded screenshot, whatever its extension, so that a download
+        # cannot overwrite the converted file and is always converted in turn
+        return os.path.join(self.root, "screenshot.converted.jpg")
+
     def getThumbPath(self):
         self.log.trace("Enter")
         if "thumb" in self.localFiles:
@@ -280,7 +341,14 @@ class RemoteAsset():
             self.cachedDestination = mhapi.assets.getAssetLocation(self.title, self.type)
         return self.cachedDestination
 
-    def getDownloadTuples(self, ignoreExisting = True, onlyMeta=False, excludeThumb=False, excludeScreenshot=False):
+    def _fileExists(self, path, existingFiles=None):
+        # existingFiles is a set of the files in the cache directories, made by a single scan.
+        # Files outside of the cache directory of the asset still need to be checked one by one.
+        if existingFiles is not None and os.path.dirname(path) == self.root:
+            return path in existingFiles
+        return os.path.exists(path)
+
+    def getDownloadTuples(self, ignoreExisting = True, onlyMeta=False, excludeThumb=False, excludeScreenshot=False, existingFiles=None):
         self.log.trace("Enter")
         downloads = []
         for key in self.remoteFiles.keys():
@@ -292,28 +360,32 @@ class RemoteAsset():
 
             self.log.trace("key",key)
 
-            if not ignoreExisting or not os.path.exists(l):
-
-                if key == "thumb" or key == "render" or key == "screenshot":
-                    self.log.trace("ismeta")
-                    if key == "thumb":
-                        if not excludeThumb:
-                            self.log.trace("Adding file for download", r)
-                            downloads.append((r, l))
-                        else:
-                            self.log.trace("Exclude due to excludeThumb",r)
-                    else:
-                        if not excludeScreenshot:
-                            self.log.trace("Adding file for download", r)
-                            downloads.append((r, l))
-                        else:
-                            self.log.trace("Exclude due to excludeScreenshot",r)
+            # Exclusions are checked first, so that the disk is not checked for files which
+            # would not be downloaded anyway
+            if key == "thumb" or key == "render" or key == "screenshot":
+                self.log.trace("ismeta")
+                if key == "thumb":
+                    if excludeThumb:
+                        self.log.trace("Exclude due to excludeThumb",r)
+                        continue
                 else:
-                    if not onlyMeta:
-                        self.log.trace("Adding file for download",r)
-                        downloads.append((r, l))
-                    else:
-                        self.log.trace("Exclude due to onlyMeta",r)
+                    if excludeScreenshot:
+                        self.log.trace("Exclude due to excludeScreenshot",r)
+                        continue
+            else:
+                if onlyMeta:
+                    self.log.trace("Exclude due to onlyMeta",r)
+                    continue
+
+            exists = False
+            if ignoreExisting:
+                exists = self._fileExists(l, existingFiles)
+                if key == "screenshot" and not exists:
+                    exists = self._fileExists(self.getConvertedScreenshotPath(), existingFiles)
+
+            if not exists:
+                self.log.trace("Adding file for download", r)
+                downloads.append((r, l))
             else:
                 self.log.trace("Ignoring file",r)
 
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Converts downloaded screenshots to size capped jpeg files in a background thread
+
+"""
+
+import gui3d
+import os
+import sys
+
+from .fileutil import replaceFile
+from .workerpool import WorkerPoolThread, WorkerPoolTask
+
+mhapi = gui3d.app.mhapi
+
+if mhapi.utility.isPython3():
+    from PyQt5 import QtGui
+    from PyQt5.QtCore import *
+else:
+    if mhapi.utility.isPySideAvailable():
+        from PySide import QtGui
+        from PySide.QtCore import *
+    else:
+        from PyQt4 import QtGui
+        from PyQt4.QtCore import *
+
+DEFAULT_WORKERS = 4
+MAX_WIDTH = 800
+MAX_HEIGHT = 600
+JPEG_QUALITY = 85
+
+
+def convertScreenshot(source, dest, maxWidth=MAX_WIDTH, maxHeight=MAX_HEIGHT, quality=JPEG_QUALITY):
+    """Write the image at source as a jpeg at dest, scaled down to fit within the given size, and
+    remove source. A jpeg which already fits is moved to dest as it is."""
+
+    reader = QtGui.QImageReader(source)
+    size = reader.size()
+    fits = size.isValid() and size.width() <= maxWidth and size.height() <= maxHeight
+
+    # The format is read from the contents of the file, whatever its extension claims
+    if fits and bytes(reader.format()) == b"jpeg":
+        if os.path.abspath(source) != os.path.abspath(dest):
+            replaceFile(source, dest)
+        return
+
+    if size.isValid() and not fits:
+        # Decoding straight to the smaller size is cheaper than scaling afterwards
+        reader.setScaledSize(size.scaled(maxWidth, maxHeight, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise IOError("Could not read " + source + ": " + str(reader.errorString()))
+
+    if image.hasAlphaChannel():
+        # Jpeg has no transparency, so put the image on white rather than on black
+        flattened = QtGui.QImage(image.size(), QtGui.QImage.Format_RGB32)
+        flattened.fill(Qt.white)
+        painter = QtGui.QPainter(flattened)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        image = flattened
+
+    tmp = dest + ".part"
+    if not image.save(tmp, "JPG", quality):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise IOError("Could not write " + dest)
+    replaceFile(tmp, dest)
+
+    if os.path.abspath(source) != os.path.abspath(dest):
+        os.remove(source)
+
+
+class ConvertThread(WorkerPoolThread):
+
+    def __init__(self, conversions, parent = None, maxWorkers=None):
+        WorkerPoolThread.__init__(self, parent, maxWorkers if maxWorkers else DEFAULT_WORKERS)
+        self.conversions = conversions
+
+        self.converted = []
+        self._completed = 0
+
+    def run(self):
+        self.log.trace("Enter")
+        self.onProgress(0.0)
+
+        # Qt does not hold the python interpreter lock while decoding, scaling and encoding
+        # images, so worker threads convert screenshots in parallel
+        self.runWorkers(self.conversions)
+
+        self.log.debug("Number of converted screenshots", len(self.converted))
+
+        self.onFinished("OK")
+        self.exiting = True
+
+    def processItem(self, conversion, context):
+        (assetId, source, dest) = conversion
+        try:
+            convertScreenshot(source, dest)
+            with self._lock:
+                self.converted.append(assetId)
+        except:
+            self.log.warn("Could not convert screenshot", source, sys.exc_info()[1])
+
+        with self._lock:
+            self._completed = self._completed + 1
+
+    def getProgress(self):
+        return float(self._completed) / float(max(len(self.conversions), 1))
+
+    def __del__(self):
+        WorkerPoolThread.__del__(self)
+        self.conversions = None
+
+
+class ConvertTask(WorkerPoolTask):
+
+    def __init__(self, parentWidget, conversions, onFinished=None, onProgress=None, maxWorkers=None):
+        """Convert the screenshots in the list of (asset id, source, destination) tuples. onFinished
+        is called with the list of asset ids which were converted."""
+
+        convertThread = ConvertThread(conversions, maxWorkers=maxWorkers)
+        WorkerPoolTask.__init__(self, convertThread, "Converting screenshots", onProgress)
+
+        self.parentWidget = parentWidget
+        self.onFinished = onFinished
+
+        self.log.debug("About to start converting number of screenshots", len(conversions))
+
+        self.start()
+
+    def finished(self, convertThread, status):
+        self.progress(1.0)
+
+        if self.onFinished is not None:
+            self.onFinished(convertThread.converted)
@@ -56,14 +56,123 @@ else:
         from PyQt4.QtGui import *
         from PyQt4.QtCore import *
 
+# Role which gives the value a cell is sorted by, for use with QSortFilterProxyModel.setSortRole()
+SORT_ROLE = Qt.UserRole
+
+# Longest text shown in a cell, longer texts are cut and shown in full as a tooltip
+MAX_DISPLAY_LENGTH = 120
+
+
+def foldCase(text):
+    """Return a key for sorting text without regard to case."""
+    if text is None:
+        return ""
+    if hasattr(text, "casefold"):
+        return text.casefold()
+    return text.lower()
+
+
+def truncateText(text, maxLength=MAX_DISPLAY_LENGTH):
+    if text is None:
+        return ""
+    text = " ".join(text.split())
+    if len(text) <= maxLength:
+        return text
+    return text[:maxLength - 3].rstrip() + "..."
+
+
+def updateRows(model, rowLists, newRowLists, key):
+    """Turn the rows of a list based model into the new rows by removing, moving and inserting rows,
+    rather than by resetting the model, so that views keep their scroll position and selection.
+
+    rowLists is a list of parallel lists which hold the rows of the model, and which are changed in
+    place. newRowLists holds the corresponding lists with the new rows. Rows are matched by the
+    value key() returns for the items of the first list, which has to be unique."""
+
+    keys = [key(item) for item in rowLists[0]]
+    newKeys = [key(item) for item in newRowLists[0]]
+    rowLists = [keys] + list(rowLists)
+    newRowLists = [newKeys] + list(newRowLists)
+
+    newPositions = {}
+    for (position, rowKey) in enumerate(newKeys):
+        newPositions[rowKey] = position
+
+    # Remove rows which are not among the new ones, in runs from the bottom up
+    row = len(keys) - 1
+    while row >= 0:
+        if keys[row] in newPositions:
+            row = row - 1
+            continue
+        last = row
+        while row >= 0 and keys[row] not in newPositions:
+            row = row - 1
+        model.beginRemoveRows(QModelIndex(), row + 1, last)
+        for rows in rowLists:
+            del rows[row + 1:last + 1]
+        model.endRemoveRows()
+
+    # Rows which are kept, but in a different order, are moved with a layout change
+    positions = [newPositions[rowKey] for rowKey in keys]
+    if positions != sorted(positions):
+        model.layoutAboutToBeChanged.emit()
+        order = sorted(range(len(keys)), key=lambda row: positions[row])
+        for rows in rowLists:
+            rows[:] = [rows[row] for row in order]
+        movedTo = {}
+        for (newRow, oldRow) in enumerate(order):
+            movedTo[oldRow] = newRow
+        oldIndexes = model.persistentIndexList()
+        newIndexes = [model.index(movedTo[index.row()], index.column()) for index in oldIndexes]
+        model.changePersistentIndexList(oldIndexes, newIndexes)
+        model.layoutChanged.emit()
+
+    # The remaining rows are now in the new order, so insert the missing rows in runs between them
+    row = 0
+    position = 0
+    while position < len(newKeys):
+        if row < len(keys) and keys[row] == newKeys[position]:
+            row = row + 1
+            position = position + 1
+            continue
+        first = position
+        while position < len(newKeys) and not (row < len(keys) and keys[row] == newKeys[position]):
+            position = position + 1
+        model.beginInsertRows(QModelIndex(), row, row + position - first - 1)
+        for (rows, newRows) in zip(rowLists, newRowLists):
+            rows[row:row] = newRows[first:position]
+        model.endInsertRows()
+        row = row + position - first
+
+
 class AssetTableModel(QAbstractTableModel):
 
-    def __init__(self, data, headers, parent=None):
+    def __init__(self, data, headers, parent=None, sortKeys=None, toolTips=None):
+        """data is a list of rows of display values. sortKeys, if given, is a list of rows of the
+        same shape with the typed values to sort by, such as ints for ids and timestamps.
+        toolTips, if given, is a list of rows of tooltip texts, which may be None."""
+
         QAbstractTableModel.__init__(self,parent)
         self.log = mhapi.utility.getLogChannel("assetdownload")
 
         self.__data=data     # Initial Data
         self.__headers=headers
+        self.__sortKeys=sortKeys
+        self.__toolTips=toolTips
+
+    def setRows(self, data, sortKeys=None, toolTips=None):
+        """Change the rows of the model in place. Rows are matched to the current rows by their
+        first column, which therefore has to be unique."""
+
+        if self.__sortKeys is None or self.__toolTips is None or sortKeys is None or toolTips is None:
+            self.beginResetModel()
+            self.__data[:] = data
+            self.__sortKeys = sortKeys
+            self.__toolTips = toolTips
+            self.endResetModel()
+            return
+
+        updateRows(self, [self.__data, self.__sortKeys, self.__toolTips], [data, sortKeys, toolTips], lambda row: row[0])
 
     def rowCount( self, parent ):
         self.log.trace("rowCount")
@@ -84,6 +193,14 @@ class AssetTableModel(QAbstractTableModel):
             else:
                 return QString(value)
 
+        if role == SORT_ROLE:
+            if self.__sortKeys is not None:
+                return self.__sortKeys[index.row()][index.column()]
+            return self.__data[index.row()][index.column()]
+
+        if role == Qt.ToolTipRole and self.__toolTips is not None:
+            return self.__toolTips[index.row()][index.column()]
+
     def headerData(self, section, orientation = Qt.Horizontal, role=Qt.DisplayRole):
         if role == Qt.DisplayRole and self.__headers is not None:
             if orientation == Qt.Horizontal:
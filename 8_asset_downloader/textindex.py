@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Tokenised full text index with BM25 ranking, used for searching asset titles and descriptions
+
+"""
+
+import re
+import math
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# BM25 tuning parameters
+K1 = 1.2
+B = 0.75
+
+# Factor for matches where the query term is only part of a word
+PARTIAL_MATCH_WEIGHT = 0.5
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TextIndex():
+
+    def __init__(self):
+        self.postings = {}
+        self.docLengths = {}
+        self._vocabulary = []
+        self._trigrams = {}
+        self._averageLength = 0.0
+
+    def addDocument(self, docId, text):
+        tokens = tokenize(text)
+        self.docLengths[docId] = len(tokens)
+        for token in tokens:
+            posting = self.postings.setdefault(token, {})
+            posting[docId] = posting.get(docId, 0) + 1
+
+    def finish(self):
+        """Build the lookup structures for the vocabulary. Must be called after the last addDocument()."""
+        self._vocabulary = sorted(self.postings.keys())
+        self._trigrams = {}
+        for token in self._vocabulary:
+            for i in range(len(token) - 2):
+                self._trigrams.setdefault(token[i:i+3], set()).add(token)
+        if self.docLengths:
+            self._averageLength = float(sum(self.docLengths.values())) / float(len(self.docLengths))
+        else:
+            self._averageLength = 0.0
+
+    def getState(self):
+        return { "postings": self.postings, "docLengths": self.docLengths }
+
+    @classmethod
+    def fromState(cls, state):
+        index = cls()
+        index.postings = state["postings"]
+        index.docLengths = state["docLengths"]
+        index.finish()
+        return index
+
+    def _matchingTokens(self, term):
+        if len(term) < 3:
+            # Too short for trigrams, so scan the vocabulary, which is much smaller than the
+            # number of documents
+            return [token for token in self._vocabulary if term in token]
+
+        candidates = None
+        for i in range(len(term) - 2):
+            withTrigram = self._trigrams.get(term[i:i+3])
+            if not withTrigram:
+                return []
+            candidates = withTrigram if candidates is None else candidates & withTrigram
+        return [token for token in candidates if term in token]
+
+    def search(self, query, candidates=None):
+        """Return a dict with the score of every document which contains all the terms of the query,
+        either as whole words or as parts of words. Returns None if the query does not contain any
+        searchable terms."""
+
+        terms = tokenize(query)
+        if not terms:
+            return None
+
+        numDocs = len(self.docLengths)
+        scores = None
+
+        for term in set(terms):
+            tokens = self._matchingTokens(term)
+
+            # The idf is that of the term over all documents containing it in some word. Taking it
+            # per matching word would let a rare longer word outweigh the term as a whole word.
+            matching = set()
+            for token in tokens:
+                matching.update(self.postings[token].keys())
+            idf = math.log(1.0 + (numDocs - len(matching) + 0.5) / (len(matching) + 0.5))
+
+            termScores = {}
+            for token in tokens:
+                posting = self.postings[token]
+                # Partial matches count less than whole words
+                weight = idf if token == term else idf * PARTIAL_MATCH_WEIGHT
+                for docId in posting:
+                    if candidates is not None and docId not in candidates:
+                        continue
+                    if scores is not None and docId not in scores:
+                        continue
+                    tf = posting[docId]
+                    norm = 1.0 - B + B * self.docLengths[docId] / self._averageLength
+                    score = weight * tf * (K1 + 1.0) / (tf + K1 * norm)
+                    if score > termScores.get(docId, 0.0):
+                        termScores[docId] = score
+
+            if scores is None:
+                scores = termScores
+            else:
+                for docId in list(scores.keys()):
+                    if docId in termScores:
+                        scores[docId] = scores[docId] + termScores[docId]
+                    else:
+                        del scores[docId]
+
+            if not scores:
+                return {}
+
+        return scores
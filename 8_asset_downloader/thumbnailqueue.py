@@ -0,0 +1,240 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Fetches thumbnails in the background as assets are shown, most visible first
+
+"""
+
+import gui3d
+import os
+import sys
+import heapq
+import threading
+
+from .downloadtask import openUrl, CHUNK_SIZE
+from .fileutil import replaceFile
+
+mhapi = gui3d.app.mhapi
+
+qtSignal = None
+
+if mhapi.utility.isPython3():
+    from PyQt5 import QtCore
+    from PyQt5.QtCore import *
+    qtSignal = QtCore.pyqtSignal
+else:
+    if mhapi.utility.isPySideAvailable():
+        from PySide import QtCore
+        from PySide.QtCore import *
+        qtSignal = QtCore.Signal
+    else:
+        from PyQt4 import QtCore
+        from PyQt4.QtCore import *
+        qtSignal = QtCore.pyqtSignal
+
+DEFAULT_WORKERS = 2
+
+# Priority of thumbnails which are needed right now, such as for the selected asset
+PRIORITY_NOW = -2
+
+# Priority of thumbnails for rows which are on screen. Unlike PRIORITY_NOW, these are
+# dropped when the shown assets change
+PRIORITY_VISIBLE = -1
+
+
+class ThumbnailQueue(QObject):
+
+    signalThumbnailReady = qtSignal(int)
+
+    def __init__(self, maxWorkers=None):
+        QObject.__init__(self)
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.maxWorkers = maxWorkers if maxWorkers else DEFAULT_WORKERS
+
+        self._condition = threading.Condition()
+        self._heap = []
+        self._queued = {}
+        self._sequence = 0
+        self._generation = 0
+        self._packJobs = []
+        self._workers = []
+        self._stopped = False
+
+        # When thumbnails are packed, fetched thumbnails are moved into this ThumbnailPack
+        self.pack = None
+
+    def request(self, assets):
+        """Queue the missing thumbnails of the given assets, in the given order. This replaces
+        what is left of earlier requests, except for thumbnails which were requested with
+        requestNow()."""
+
+        with self._condition:
+            self._generation = self._generation + 1
+            for asset in assets:
+                self._push(asset, 0)
+            self._condition.notify_all()
+        self._startWorkers()
+
+    def requestVisible(self, asset):
+        """Queue the thumbnail of the given asset ahead of the current request. It is dropped
+        together with the current request, by the next call of request() or cancel()."""
+
+        with self._condition:
+            self._push(asset, PRIORITY_VISIBLE)
+            self._condition.notify_all()
+        self._startWorkers()
+
+    def cancel(self):
+        """Drop what is left of earlier requests, except for thumbnails which were requested
+        with requestNow()."""
+
+        with self._condition:
+            self._generation = self._generation + 1
+
+    def requestNow(self, asset):
+        """Queue the thumbnail of the given asset ahead of everything else."""
+
+        with self._condition:
+            self._push(asset, PRIORITY_NOW)
+            self._condition.notify_all()
+        self._startWorkers()
+
+    def packFiles(self, files):
+        """Move the given dict of asset id -> thumbnail file path into the pack on a worker thread,
+        ahead of the thumbnails which are queued for fetching."""
+
+        with self._condition:
+            self._packJobs.append(files)
+            self._condition.notify_all()
+        self._startWorkers()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._heap = []
+            self._queued = {}
+            self._packJobs = []
+            self._condition.notify_all()
+
+    def _push(self, asset, priority):
+        thumbPath = asset.getThumbPath()
+        if thumbPath is None or "thumb" not in asset.remoteFiles:
+            return
+
+        assetId = asset.getId()
+        if assetId in self._queued and self._queued[assetId][0] < priority:
+            # Already queued more urgently, but it now also belongs to the current request
+            priority = self._queued[assetId][0]
+
+        # Only the latest push of an asset is fetched, earlier ones are skipped when popped
+        self._sequence = self._sequence + 1
+        self._queued[assetId] = (priority, self._sequence)
+        heapq.heappush(self._heap, (priority, self._sequence, self._generation, assetId, asset.remoteFiles["thumb"], thumbPath))
+
+    def _pop(self):
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                if self._packJobs:
+                    return self._packJobs.pop(0)
+                while self._heap:
+                    item = heapq.heappop(self._heap)
+                    (priority, sequence, generation, assetId, remote, local) = item
+                    if self._queued.get(assetId) != (priority, sequence):
+                        continue
+                    del self._queued[assetId]
+                    # Items from earlier requests are dropped, unless they were requested with PRIORITY_NOW
+                    if priority != PRIORITY_NOW and generation != self._generation:
+                        continue
+                    return item
+                self._condition.wait()
+
+    def _startWorkers(self):
+        with self._condition:
+            self._stopped = False
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.maxWorkers:
+                worker = threading.Thread(target=self._worker)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def _worker(self):
+        while True:
+            item = self._pop()
+            if item is None:
+                return
+            if isinstance(item, dict):
+                self._packFiles(item)
+                continue
+            (priority, sequence, generation, assetId, remote, local) = item
+
+            pack = self.pack
+            if os.path.exists(local) or (pack is not None and pack.has(assetId)):
+                continue
+
+            try:
+                self._fetch(remote, local)
+                # Once stopped the pack may already be closed, and the file is packed on the next sync
+                if pack is not None and not self._stopped:
+                    pack.importFiles({ assetId: local })
+            except:
+                self.log.warn("Could not fetch thumbnail", remote, sys.exc_info()[1])
+                continue
+
+            self.signalThumbnailReady.emit(int(assetId))
+
+    def _packFiles(self, files):
+        pack = self.pack
+        if pack is None or self._stopped:
+            # Files which are not packed are picked up by the next sync
+            return
+        try:
+            pack.importFiles(files)
+        except:
+            self.log.warn("Could not move thumbnails into the pack", sys.exc_info()[1])
+
+    def _fetch(self, remote, local):
+        dn = os.path.dirname(local)
+        if not os.path.exists(dn):
+            try:
+                os.makedirs(dn)
+            except OSError:
+                if not os.path.isdir(dn):
+                    raise
+
+        self.log.trace("About to fetch thumbnail", remote)
+
+        tmp = local + ".part"
+        requrl = openUrl(remote)
+        try:
+            with open(tmp, "wb") as f:
+                while True:
+                    buf = requrl.read(CHUNK_SIZE)
+                    if not buf:
+                        break
+                    f.write(buf)
+            replaceFile(tmp, local)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            requrl.close()
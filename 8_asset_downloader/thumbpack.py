@@ -0,0 +1,193 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Keeps thumbnails packed in a single append-only file, read through mmap
+
+"""
+
+import gui3d
+import os
+import mmap
+import threading
+
+from .fileutil import replaceFile
+
+mhapi = gui3d.app.mhapi
+
+
+class ThumbnailPack():
+
+    def __init__(self, path, store):
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.path = path
+        self.store = store
+        self._lock = threading.RLock()
+        self._map = None
+        self._file = None
+
+        # The offsets of the thumbnails are kept in the asset store, and in memory for lookups.
+        # Blobs are only ever appended, so replaced and removed thumbnails leave dead space
+        # behind until the pack is compacted.
+        self.index = store.getThumbPackIndex()
+
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+            if self.index:
+                self.log.warn("Thumbnail pack is missing, dropping its index")
+                self.index = {}
+                store.replaceThumbPackIndex(self.index)
+
+    def has(self, assetId):
+        return assetId in self.index
+
+    def getIds(self):
+        with self._lock:
+            return list(self.index.keys())
+
+    def get(self, assetId):
+        """Return the bytes of the thumbnail of the given asset, or None if it is not in the pack."""
+
+        with self._lock:
+            entry = self.index.get(assetId)
+            if entry is None:
+                return None
+            (offset, length) = entry
+            if self._map is None or offset + length > len(self._map):
+                self._remap()
+            if offset + length > len(self._map):
+                self.log.warn("Thumbnail pack is shorter than its index", assetId)
+                return None
+            return self._map[offset:offset + length]
+
+    def put(self, assetId, data):
+        self.putMany({ assetId: data })
+
+    def putMany(self, thumbnails):
+        """Append the given dict of asset id -> thumbnail bytes to the pack."""
+
+        if not thumbnails:
+            return
+
+        entries = {}
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                for assetId in thumbnails:
+                    data = thumbnails[assetId]
+                    entries[assetId] = (f.tell(), len(data))
+                    f.write(data)
+            # The index is only updated once the data is on disk, so that an interrupted
+            # write at worst leaves some dead space at the end of the pack
+            self.store.upsertThumbPackEntries(entries)
+            self.index.update(entries)
+
+    def remove(self, assetIds):
+        with self._lock:
+            assetIds = [assetId for assetId in assetIds if assetId in self.index]
+            if not assetIds:
+                return
+            self.store.deleteThumbPackEntries(assetIds)
+            for assetId in assetIds:
+                del self.index[assetId]
+
+    def importFiles(self, files):
+        """Move the given dict of asset id -> thumbnail file path into the pack. Returns the number of
+        imported files."""
+
+        imported = 0
+        batch = {}
+        for assetId in files:
+            path = files[assetId]
+            try:
+                with open(path, "rb") as f:
+                    batch[assetId] = f.read()
+            except (IOError, OSError):
+                continue
+            if len(batch) >= 500:
+                imported = imported + self._importBatch(batch, files)
+                batch = {}
+        imported = imported + self._importBatch(batch, files)
+
+        self.log.debug("Number of thumbnails moved into the pack", imported)
+        return imported
+
+    def _importBatch(self, batch, files):
+        self.putMany(batch)
+        for assetId in batch:
+            try:
+                os.remove(files[assetId])
+            except OSError:
+                pass
+        return len(batch)
+
+    def getDeadSpace(self):
+        """Return the number of bytes in the pack which are not used by any thumbnail."""
+        with self._lock:
+            used = 0
+            for (offset, length) in self.index.values():
+                used = used + length
+            return os.path.getsize(self.path) - used
+
+    def compact(self):
+        """Rewrite the pack with only the thumbnails which are still in the index. Returns the number
+        of bytes reclaimed."""
+
+        with self._lock:
+            before = os.path.getsize(self.path)
+            tmp = self.path + ".tmp"
+            newIndex = {}
+
+            with open(self.path, "rb") as src, open(tmp, "wb") as dest:
+                for assetId in sorted(self.index.keys(), key=lambda assetId: self.index[assetId][0]):
+                    (offset, length) = self.index[assetId]
+                    src.seek(offset)
+                    newIndex[assetId] = (dest.tell(), length)
+                    dest.write(src.read(length))
+
+            # The map has to be closed before the file can be replaced on windows
+            self._closeMap()
+            replaceFile(tmp, self.path)
+
+            self.store.replaceThumbPackIndex(newIndex)
+            self.index = newIndex
+
+            reclaimed = before - os.path.getsize(self.path)
+            self.log.debug("Bytes reclaimed by compacting the thumbnail pack", reclaimed)
+            return reclaimed
+
+    def close(self):
+        with self._lock:
+            self._closeMap()
+
+    def _remap(self):
+        self._closeMap()
+        if os.path.getsize(self.path) == 0:
+            # An empty file cannot be mapped
+            self._map = b""
+            return
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _closeMap(self):
+        if self._map is not None and not isinstance(self._map, bytes):
+            self._map.close()
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman community assets
+
+**Product Home Page:** http://www.makehumancommunity.org
+
+**Code Home Page:**    https://github.com/makehumancommunity/community-plugins
+
+**Authors:**           Joel Palmius
+
+**Copyright(c):**      Joel Palmius 2016
+
+**Licensing:**         MIT
+
+Abstract
+--------
+
+Base classes for background threads which work through a list of items with a pool of worker
+threads, and for the tasks which show their progress
+
+"""
+
+import gui3d
+import sys
+import time
+import threading
+
+from progress import Progress
+
+if sys.version_info >= (3, 0):
+    import queue
+else:
+    import Queue as queue
+
+mhapi = gui3d.app.mhapi
+
+qtSignal = None
+
+if mhapi.utility.isPython3():
+    from PyQt5 import QtCore
+    from PyQt5.QtCore import *
+    qtSignal = QtCore.pyqtSignal
+else:
+    if mhapi.utility.isPySideAvailable():
+        from PySide import QtCore
+        from PySide.QtCore import *
+        qtSignal = QtCore.Signal
+    else:
+        from PyQt4 import QtCore
+        from PyQt4.QtCore import *
+        qtSignal = QtCore.pyqtSignal
+
+DEFAULT_WORKERS = 4
+
+# Least number of seconds between two progress reports
+PROGRESS_INTERVAL = 0.5
+
+
+class WorkerPoolThread(QThread):
+
+    signalProgress = qtSignal(float)
+    signalFinished = qtSignal(str)
+
+    def __init__(self, parent = None, maxWorkers=None):
+        QThread.__init__(self, parent)
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+        self.exiting = False
+        self.maxWorkers = maxWorkers if maxWorkers else DEFAULT_WORKERS
+
+        self._lock = threading.Lock()
+        self._lastReport = 0.0
+
+    def runWorkers(self, items):
+        """Call processItem() for each of the items on up to maxWorkers threads, and return when
+        all items have been processed."""
+
+        work = queue.Queue()
+        for item in items:
+            work.put(item)
+
+        self._lastReport = time.time()
+
+        numWorkers = max(1, min(self.maxWorkers, work.qsize()))
+        self.log.debug("Number of workers", numWorkers)
+
+        workers = []
+        for i in range(numWorkers):
+            worker = threading.Thread(target=self._worker, args=(work,))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+
+    def _worker(self, work):
+        context = {}
+        try:
+            while self.keepWorking():
+                try:
+                    item = work.get_nowait()
+                except queue.Empty:
+                    return
+                self.processItem(item, context)
+                self.reportProgress()
+        finally:
+            self.finishWorker(context)
+
+    def keepWorking(self):
+        """Return False to make the workers stop taking items."""
+        return not self.exiting
+
+    def processItem(self, item, context):
+        """Process one item. context is a dict which belongs to the calling worker thread."""
+        raise NotImplementedError()
+
+    def finishWorker(self, context):
+        """Release what processItem() has kept in the context of a worker thread."""
+        pass
+
+    def getProgress(self):
+        """Return the progress as a float between 0 and 1. Called with the lock held."""
+        raise NotImplementedError()
+
+    def reportProgress(self):
+        # Every report is a signal to the main thread, so reports are limited to one per interval
+        # however many workers there are and however small the pieces of work are
+        with self._lock:
+            now = time.time()
+            if now - self._lastReport < PROGRESS_INTERVAL:
+                return
+            self._lastReport = now
+            prog = self.getProgress()
+        self.onProgress(prog)
+
+    def onProgress(self, prog = 0.0):
+        self.log.trace("onProgress",prog)
+        self.signalProgress.emit(prog)
+
+    def onFinished(self, status = "OK"):
+        self.log.trace("Enter")
+        self.signalFinished.emit(status)
+
+    def __del__(self):
+        self.exiting = True
+        self.log = None
+
+
+class WorkerPoolTask():
+
+    def __init__(self, thread, description, onProgress=None):
+        """Show the progress of the given WorkerPoolThread and start it. Subclasses implement
+        finished(), which is called with the status once the thread is done."""
+
+        self.log = mhapi.utility.getLogChannel("assetdownload")
+
+        self.description = description
+        self.onProgress = onProgress
+
+        self.thread = thread
+        self.thread.signalProgress.connect(self._onProgress)
+        self.thread.signalFinished.connect(self._onFinished)
+
+        self.progress = Progress()
+
+    def start(self):
+        self.thread.start()
+
+    def _onProgress(self, prog=0.0):
+        self.log.trace("_onProgress",prog)
+
+        self.progress(prog,desc=self.description)
+
+        if self.onProgress is not None:
+            self.onProgress(prog)
+
+    def _onFinished(self, status = "OK"):
+        self.log.trace("Enter")
+        self.log.debug("Status", status)
+
+        thread = self.thread
+        thread.signalProgress.disconnect(self._onProgress)
+        thread.signalFinished.disconnect(self._onFinished)
+        self.thread = None
+
+        self.finished(thread, status)
+
+    def finished(self, thread, status):
+        raise NotImplementedError()
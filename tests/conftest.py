@@ -0,0 +1,202 @@
+"""
+Makes the modules of the asset downloader importable outside of MakeHuman.
+
+The plugin directory is registered as the package "assetdownloader" without running its
+__init__.py, which would build the whole GUI. When the MakeHuman modules the plugin imports are
+not available, a minimal stand-in for them is registered, which only provides what the tested
+modules use at import time: gui3d.app.mhapi, progress.Progress and core.G.
+
+Tests which load an asset DB write their catalog with makeAsset() and writeCatalog() into the
+directory of the catalogRoot fixture.
+"""
+
+import os
+import sys
+import json
+import types
+import shutil
+import logging
+import tempfile
+import importlib
+
+import pytest
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "8_asset_downloader")
+PACKAGE = "assetdownloader"
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+class _LogChannel():
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level, *args):
+        self.logger.log(level, " ".join([str(arg) for arg in args]))
+
+    def spam(self, *args):
+        pass
+
+    def trace(self, *args):
+        pass
+
+    def debug(self, *args):
+        self._log(logging.DEBUG, *args)
+
+    def info(self, *args):
+        self._log(logging.INFO, *args)
+
+    def warn(self, *args):
+        self._log(logging.WARNING, *args)
+
+    def error(self, *args):
+        self._log(logging.ERROR, *args)
+
+
+class _Utility():
+
+    isPy3 = sys.version_info >= (3, 0)
+
+    def isPython3(self):
+        return self.isPy3
+
+    def isPySideAvailable(self):
+        return False
+
+    def getLogChannel(self, name):
+        return _LogChannel(name)
+
+    def getCompatibleUrlFetcher(self):
+        import urllib.request
+        return urllib.request
+
+
+class _Locations():
+
+    def __init__(self, root):
+        self.root = root
+
+    def getUserDataPath(self, subPath=None):
+        if subPath is None:
+            return os.path.join(self.root, "data")
+        return os.path.join(self.root, "data", subPath)
+
+    def getSystemDataPath(self, subPath=""):
+        return os.path.join(self.root, "system", subPath)
+
+
+class _Assets():
+
+    def __init__(self, locations):
+        self.locations = locations
+
+    def getAssetTypes(self):
+        return ["material", "model", "clothes", "hair", "teeth", "eyebrows", "eyelashes", "tongue", "eyes", "proxy", "skin", "pose", "expression", "rig", "target"]
+
+    def getAssetLocation(self, title, assetType):
+        return os.path.join(self.locations.getUserDataPath(), assetType, title.replace(" ", "_").lower())
+
+
+def _installHost():
+    root = tempfile.mkdtemp(prefix="mhhost")
+
+    mhapi = types.SimpleNamespace()
+    mhapi.utility = _Utility()
+    mhapi.locations = _Locations(root)
+    mhapi.assets = _Assets(mhapi.locations)
+
+    gui3d = types.ModuleType("gui3d")
+    gui3d.app = types.SimpleNamespace(mhapi=mhapi)
+    gui3d.TaskView = object
+    sys.modules["gui3d"] = gui3d
+
+    progress = types.ModuleType("progress")
+
+    class Progress():
+        def __call__(self, *args, **kwargs):
+            pass
+
+    progress.Progress = Progress
+    sys.modules["progress"] = progress
+
+    core = types.ModuleType("core")
+    core.G = types.SimpleNamespace(app=gui3d.app)
+    sys.modules["core"] = core
+
+    for name in ["mh", "gui", "log"]:
+        sys.modules[name] = types.ModuleType(name)
+
+
+def _registerPackage():
+    if PACKAGE in sys.modules:
+        return
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [PLUGIN_DIR]
+    sys.modules[PACKAGE] = package
+
+
+try:
+    import gui3d
+except ImportError:
+    _installHost()
+    import gui3d
+
+_registerPackage()
+
+
+def importPlugin(name):
+    """Import a module of the plugin, such as "textindex"."""
+    return importlib.import_module(PACKAGE + "." + name)
+
+
+@pytest.fixture
+def plugin():
+    return importPlugin
+
+
+# Extension of the pertinent file of each asset type
+EXTENSIONS = { "clothes": "mhclo", "hair": "mhclo", "material": "mhmat", "skin": "mhmat", "pose": "bvh", "expression": "mhpose", "rig": "mhskel", "model": "mhm" }
+
+
+def makeAsset(nid, assetType="clothes", category=None, author="author", changed="2020-01-01 10:00:00", files=None):
+    """Return the json of an asset in the catalog. files maps kinds of file, such as "thumb" or
+    "render", to file names, and defaults to the pertinent file and a thumbnail."""
+
+    if files is None:
+        extension = EXTENSIONS.get(assetType, "file")
+        files = { extension: "a%d.%s" % (nid, extension), "thumb": "thumb.png" }
+
+    asset = {
+        "nid": nid,
+        "type": assetType,
+        "title": "%s %d" % (assetType, nid),
+        "description": "a synthetic asset number %d" % nid,
+        "username": author,
+        "uid": 1,
+        "license": "CC0",
+        "changed": changed,
+        "created": "2019-01-01 10:00:00",
+        "files": dict([(kind, "http://example.com/%d/%s" % (nid, files[kind])) for kind in files])
+    }
+    if category is not None:
+        asset["category"] = category
+    if assetType == "material":
+        asset["belongs_to"] = { "belonging_is_assigned": False }
+    return asset
+
+
+def writeCatalog(root, assets):
+    """Write the given asset jsons as the catalog which was downloaded last."""
+    with open(os.path.join(root, "remote.json"), "w") as f:
+        json.dump(dict([(str(asset["nid"]), asset) for asset in assets]), f)
+
+
+@pytest.fixture
+def catalogRoot():
+    """The empty community-assets directory of the user data path."""
+    root = gui3d.app.mhapi.locations.getUserDataPath("community-assets")
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+    yield root
+    shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,227 @@
+"""
+Loading and re-loading the asset catalog.
+"""
+
+import os
+import json
+import time
+import shutil
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from conftest import importPlugin, makeAsset, writeCatalog
+
+assetdb = importPlugin("assetdb")
+
+
+class _SyncDownloads():
+    """Stands in for DownloadTask during a sync. assets.json is served from the given catalog,
+    and no other file is fetched. The tasks finish when run() is called, like the real ones
+    finish after the call which started them has returned."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.pending = []
+
+    def __call__(self, parentWidget, files, onFinished=None, onProgress=None):
+        task = type("Task", (), {})()
+        task.notModified = []
+        for download in files:
+            if download[0].endswith("assets.json"):
+                with open(download[1], "w") as f:
+                    json.dump(dict([(str(asset["nid"]), asset) for asset in self.catalog]), f)
+        self.pending.append(onFinished)
+        return task
+
+    def run(self):
+        while self.pending:
+            self.pending.pop(0)()
+
+
+def synchronize(db, catalog, monkeypatch):
+    downloads = _SyncDownloads(catalog)
+    monkeypatch.setattr(assetdb, "DownloadTask", downloads)
+    finished = []
+    db.synchronizeRemote(None, onFinished=lambda: finished.append(True), downloadScreenshots=False, downloadThumbnails=False)
+    downloads.run()
+    assert finished
+
+
+def test_resync_forgets_dropped_clothes_categories(catalogRoot, monkeypatch):
+    writeCatalog(catalogRoot, [makeAsset(1, category="Shoes"), makeAsset(2, category="Hat")])
+    db = assetdb.AssetDB(None)
+    assert db.getKnownClothesCategories() == ["hat", "shoes"]
+
+    synchronize(db, [makeAsset(1, category="Shoes"), makeAsset(2, category="Gloves", changed="2020-02-01 10:00:00")], monkeypatch)
+
+    assert db.getKnownClothesCategories() == ["gloves", "shoes"]
+    assert db.getLastSyncChanges()["changed"] == [2]
+    db.close()
+
+
+def test_refresh_returns_asset_directories_before_files_arrive(catalogRoot):
+    writeCatalog(catalogRoot, [makeAsset(1, category="Shoes")])
+    db = assetdb.AssetDB(None)
+    location = os.path.normpath(db.assetsById[1].getInstallPath())
+    parent = os.path.dirname(location)
+    shutil.rmtree(parent, ignore_errors=True)
+
+    os.makedirs(location)
+    assert db.refreshLocalDirectory(parent) == [location]
+    assert 1 not in db.downloadedIds.get("clothes", set())
+
+    with open(os.path.join(location, "a1.mhclo"), "w") as f:
+        f.write("name c1\n")
+    assert db.refreshLocalDirectory(location) == [location]
+    assert 1 in db.downloadedIds["clothes"]
+
+    shutil.rmtree(parent)
+    db.close()
+
+
+def test_watching_can_be_turned_off(catalogRoot):
+    writeCatalog(catalogRoot, [makeAsset(1, category="Shoes")])
+    db = assetdb.AssetDB(None)
+    assert db.isWatchingLocalAssets()
+
+    db.setWatchingLocalAssets(False)
+    db.startWatching()
+    assert db.watcher is None
+    db.close()
+
+    db = assetdb.AssetDB(None)
+    assert not db.isWatchingLocalAssets()
+    db.close()
+
+
+def test_invalidate_thumbnails_removes_the_cached_file(catalogRoot):
+    writeCatalog(catalogRoot, [makeAsset(1, category="Shoes"), makeAsset(2, category="Hat")])
+    db = assetdb.AssetDB(None)
+    for assetId in [1, 2]:
+        thumbPath = db.assetsById[assetId].getThumbPath()
+        os.makedirs(os.path.dirname(thumbPath))
+        with open(thumbPath, "wb") as f:
+            f.write(b"png")
+
+    db._invalidateThumbnails([1])
+
+    assert db.getThumbData(db.assetsById[1]) is None
+    assert db.getThumbData(db.assetsById[2]) == b"png"
+    db.close()
+
+
+def writeThumb(db, assetId, data):
+    thumbPath = db.assetsById[assetId].getThumbPath()
+    if not os.path.exists(os.path.dirname(thumbPath)):
+        os.makedirs(os.path.dirname(thumbPath))
+    with open(thumbPath, "wb") as f:
+        f.write(data)
+    return thumbPath
+
+
+def waitForPacked(db, assetId):
+    pack = db.getThumbnailPack()
+    deadline = time.time() + 10
+    while not pack.has(assetId) and time.time() < deadline:
+        time.sleep(0.01)
+    return pack.has(assetId)
+
+
+def test_packing_runs_on_the_thumbnail_queue(catalogRoot):
+    writeCatalog(catalogRoot, [makeAsset(1, category="Shoes")])
+    db = assetdb.AssetDB(None)
+    thumbPath = writeThumb(db, 1, b"old")
+
+    db.setPackedThumbnails(True)
+
+    assert waitForPacked(db, 1)
+    assert not os.path.exists(thumbPath)
+    assert db.getThumbData(db.assetsById[1]) == b"old"
+    db.close()
+
+
+def installAsset(db, assetId):
+    asset = db.assetsById[assetId]
+    location = asset.getInstallPath()
+    if not os.path.exists(location):
+        os.makedirs(location)
+    with open(os.path.join(location, asset.getPertinentFileName()), "w") as f:
+        f.write("name c%d\n" % assetId)
+    db._downloadAsset = asset
+    db._downloadonFinished = None
+    return location
+
+
+def test_downloaded_thumbnail_replaces_the_packed_one(catalogRoot):
+    writeCatalog(catalogRoot, [makeAsset(1, category="Shoes")])
+    db = assetdb.AssetDB(None)
+    writeThumb(db, 1, b"old")
+    db.setPackedThumbnails(True)
+    assert waitForPacked(db, 1)
+
+    location = installAsset(db, 1)
+    writeThumb(db, 1, b"new")
+    db._downloadFinished(0, None)
+
+    with open(os.path.join(location, "a1.thumb"), "rb") as f:
+        assert f.read() == b"new"
+    assert db.getThumbData(db.assetsById[1]) == b"new"
+    assert waitForPacked(db, 1)
+    assert db.getThumbData(db.assetsById[1]) == b"new"
+
+    shutil.rmtree(location)
+    db.close()
+
+
+def test_download_without_thumbnail_installs_no_thumb_file(catalogRoot):
+    writeCatalog(catalogRoot, [makeAsset(1, category="Shoes")])
+    db = assetdb.AssetDB(None)
+
+    location = installAsset(db, 1)
+    db._downloadFinished(0, None)
+
+    assert not os.path.exists(os.path.join(location, "a1.thumb"))
+    assert 1 in db.downloadedIds["clothes"]
+
+    shutil.rmtree(location)
+    db.close()
+
+
+def test_filters_are_answered_by_the_store(catalogRoot):
+    assets = [makeAsset(1, category="Shoes"), makeAsset(2, category="Hat", changed="2020-03-01 10:00:00"), makeAsset(3, category="Shoes", author="other", changed="2020-02-01 10:00:00")]
+    writeCatalog(catalogRoot, assets)
+    db = assetdb.AssetDB(None)
+
+    assert db._getStore().queryAssetIds("clothes", category="shoes") == [1, 3]
+
+    def ids(**criteria):
+        return [asset.getId() for asset in db.getFilteredAssets("clothes", **criteria)]
+
+    assert ids() == [1, 2, 3]
+    assert ids(newestFirst=True) == [2, 3, 1]
+    assert ids(subtype="shoes", newestFirst=True) == [3, 1]
+    assert ids(author="other") == [3]
+    assert ids(subtype="shoes", within=[1, 2]) == [1]
+    db.close()
+
+
+def test_sync_scope_applies_after_the_next_sync(catalogRoot, monkeypatch):
+    catalog = [makeAsset(1, category="Shoes"), makeAsset(2, "pose")]
+    writeCatalog(catalogRoot, catalog)
+    db = assetdb.AssetDB(None)
+    db.setSyncTypes(["clothes"])
+    db.close()
+
+    # Only choosing the scope does not change what is loaded
+    db = assetdb.AssetDB(None)
+    assert sorted(db.assetsById) == [1, 2]
+
+    synchronize(db, catalog, monkeypatch)
+    assert sorted(db.assetsById) == [1]
+    db.close()
+
+    db = assetdb.AssetDB(None)
+    assert sorted(db.assetsById) == [1]
+    db.close()
@@ -0,0 +1,146 @@
+"""
+Resuming downloads against a local HTTP server which drops connections and misbehaves with ranges.
+"""
+
+import os
+import re
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from conftest import importPlugin
+
+downloadtask = importPlugin("downloadtask")
+
+BODY = bytes(bytearray(range(256))) * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+
+        body = server.body
+        status = 200
+        start = 0
+
+        rangeHeader = self.headers.get("Range")
+        ifRange = self.headers.get("If-Range")
+        if rangeHeader and server.mode != "ignoreRange" and (ifRange is None or ifRange == server.etag):
+            if server.mode == "refuseRange":
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start = int(re.match(r"bytes=(\d+)-", rangeHeader).group(1))
+            status = 206
+
+        self.send_response(status)
+        self.send_header("ETag", server.etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body) - start))
+        if status == 206:
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, len(body) - 1, len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        if server.dropAfter is not None:
+            # Only the first response is cut short
+            self.wfile.write(body[start:start + server.dropAfter])
+            server.dropAfter = None
+            return
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    for name in ["http_proxy", "HTTP_PROXY", "all_proxy", "ALL_PROXY"]:
+        monkeypatch.delenv(name, raising=False)
+
+    httpd = HTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.body = BODY
+    httpd.etag = '"v1"'
+    httpd.mode = None
+    httpd.dropAfter = None
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    httpd.url = "http://127.0.0.1:%d/asset.zip" % httpd.server_port
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _download(server, local):
+    thread = downloadtask.DownloadThread([(server.url, local)])
+    thread._downloadFile(server.url, local)
+
+
+def _dropFirstResponse(server, local):
+    server.dropAfter = 100000
+    with pytest.raises(Exception):
+        _download(server, local)
+    assert not os.path.exists(local)
+    assert os.path.getsize(local + ".part") == 100000
+
+
+def test_resumes_after_dropped_connection(server, tmpdir):
+    local = str(tmpdir.join("asset.zip"))
+    _dropFirstResponse(server, local)
+
+    _download(server, local)
+
+    assert server.requests[-1]["Range"] == "bytes=100000-"
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    with open(local, "rb") as f:
+        assert f.read() == BODY
+    assert not os.path.exists(local + ".part")
+    assert not os.path.exists(local + ".part.json")
+
+
+def test_starts_over_when_server_ignores_range(server, tmpdir):
+    local = str(tmpdir.join("asset.zip"))
+    _dropFirstResponse(server, local)
+
+    server.mode = "ignoreRange"
+    _download(server, local)
+
+    assert server.requests[-1]["Range"] == "bytes=100000-"
+    with open(local, "rb") as f:
+        assert f.read() == BODY
+
+
+def test_starts_over_when_file_changed(server, tmpdir):
+    local = str(tmpdir.join("asset.zip"))
+    _dropFirstResponse(server, local)
+
+    # The If-Range validator no longer matches, so the server sends the whole new file
+    server.etag = '"v2"'
+    server.body = BODY[::-1]
+    _download(server, local)
+
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    with open(local, "rb") as f:
+        assert f.read() == BODY[::-1]
+
+
+def test_starts_over_when_range_is_refused(server, tmpdir):
+    local = str(tmpdir.join("asset.zip"))
+    _dropFirstResponse(server, local)
+
+    server.mode = "refuseRange"
+    _download(server, local)
+
+    assert server.requests[-2]["Range"] == "bytes=100000-"
+    assert "Range" not in server.requests[-1]
+    with open(local, "rb") as f:
+        assert f.read() == BODY
@@ -0,0 +1,96 @@
+"""
+Converting downloaded screenshots, which is decided by the format and size of the image rather
+than by the file name.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from PyQt5 import QtGui
+from PyQt5.QtCore import Qt
+
+from conftest import importPlugin, makeAsset, writeCatalog
+
+screenshotconverter = importPlugin("screenshotconverter")
+assetdb = importPlugin("assetdb")
+
+@pytest.fixture(scope="module", autouse=True)
+def application():
+    app = QtGui.QGuiApplication.instance()
+    if app is None:
+        app = QtGui.QGuiApplication([])
+    yield app
+
+
+def writeImage(path, width, height, fmt):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.fill(Qt.red)
+    assert image.save(path, fmt)
+
+
+def readImage(path):
+    reader = QtGui.QImageReader(path)
+    return (bytes(reader.format()), reader.size().width(), reader.size().height())
+
+
+def test_large_jpeg_is_scaled(tmpdir):
+    source = str(tmpdir.join("screenshot.jpg"))
+    dest = str(tmpdir.join("screenshot.converted.jpg"))
+    writeImage(source, 2000, 1000, "JPG")
+
+    screenshotconverter.convertScreenshot(source, dest)
+
+    assert readImage(dest) == (b"jpeg", 800, 400)
+    assert not os.path.exists(source)
+
+
+def test_small_jpeg_is_moved_unchanged(tmpdir):
+    source = str(tmpdir.join("screenshot.jpg"))
+    dest = str(tmpdir.join("screenshot.converted.jpg"))
+    writeImage(source, 400, 300, "JPG")
+    with open(source, "rb") as f:
+        data = f.read()
+
+    screenshotconverter.convertScreenshot(source, dest)
+
+    with open(dest, "rb") as f:
+        assert f.read() == data
+    assert not os.path.exists(source)
+
+
+def test_small_png_named_jpg_is_encoded(tmpdir):
+    source = str(tmpdir.join("screenshot.jpg"))
+    dest = str(tmpdir.join("screenshot.converted.jpg"))
+    writeImage(source, 400, 300, "PNG")
+
+    screenshotconverter.convertScreenshot(source, dest)
+
+    assert readImage(dest) == (b"jpeg", 400, 300)
+
+
+@pytest.mark.parametrize("render", ["render.jpg", "render.png"])
+def test_redownloaded_screenshot_is_converted_again(catalogRoot, render):
+    writeCatalog(catalogRoot, [makeAsset(1, "pose", files={ "bvh": "a1.bvh", "render": render })])
+    db = assetdb.AssetDB(None)
+    asset = db.assetsById[1]
+
+    # A first download, and a changed screenshot downloaded again after a sync
+    for width in [2000, 1600]:
+        (remote, local) = asset.getDownloadTuples(ignoreExisting=False, onlyMeta=True, excludeThumb=True)[0]
+        assert local != asset.getConvertedScreenshotPath()
+        if not os.path.exists(os.path.dirname(local)):
+            os.makedirs(os.path.dirname(local))
+        writeImage(local, width, 1000, "PNG" if render.endswith("png") else "JPG")
+
+        (assetId, source, dest) = db.getScreenshotConversions(db.getCachedFiles())[0]
+        screenshotconverter.convertScreenshot(source, dest)
+
+        assert asset.getScreenshotPath() == asset.getConvertedScreenshotPath()
+        assert readImage(asset.getScreenshotPath()) == (b"jpeg", 800, 800 * 1000 // width)
+        assert db.getScreenshotConversions(db.getCachedFiles()) == []
+
+    assert asset.getDownloadTuples(ignoreExisting=True, onlyMeta=True, excludeThumb=True) == []
+    db.close()
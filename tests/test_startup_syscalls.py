@@ -0,0 +1,125 @@
+"""
+Startup benchmark: counts the file system calls made while loading the asset catalog.
+
+Parsing the catalog must not touch the disk once per asset, since that makes startup very slow
+on network home directories. Run with "python -m pytest -s tests/test_startup_syscalls.py" to
+see the counts and timings.
+"""
+
+import os
+import time
+import threading
+import functools
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from conftest import importPlugin, makeAsset, writeCatalog, EXTENSIONS
+
+remoteasset = importPlugin("remoteasset")
+assetdb = importPlugin("assetdb")
+
+COUNTED = [
+    (os, "stat"), (os, "lstat"), (os, "listdir"), (os, "mkdir"), (os, "makedirs"),
+    (os.path, "exists"), (os.path, "isdir"), (os.path, "isfile"), (os.path, "getsize"), (os.path, "getmtime")
+]
+
+if hasattr(os, "scandir"):
+    COUNTED.append((os, "scandir"))
+
+
+class SyscallCounter():
+    """Counts calls of the file system functions in COUNTED. A call which is made from within
+    another counted call, such as the os.stat() in os.path.exists(), is not counted again."""
+
+    def __init__(self, monkeypatch):
+        self.count = 0
+        self.byName = {}
+        self._local = threading.local()
+        for (module, name) in COUNTED:
+            monkeypatch.setattr(module, name, self._wrap(name, getattr(module, name)))
+
+    def _wrap(self, name, function):
+        @functools.wraps(function)
+        def counted(*args, **kwargs):
+            depth = getattr(self._local, "depth", 0)
+            if depth == 0:
+                self.count = self.count + 1
+                self.byName[name] = self.byName.get(name, 0) + 1
+            self._local.depth = depth + 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._local.depth = depth
+        return counted
+
+    def reset(self):
+        self.count = 0
+        self.byName = {}
+
+
+def makeCatalog(size):
+    """Return a list of size asset jsons of all kinds of assets."""
+    types = ["clothes", "material", "pose", "target", "rig", "expression", "proxy", "skin", "model", "hair"]
+    catalog = []
+    for nid in range(1, size + 1):
+        assetType = types[nid % len(types)]
+        extension = EXTENSIONS.get(assetType, "file")
+        files = { extension: "a%d.%s" % (nid, extension), "thumb": "thumb.png", "render": "render.png" }
+        if assetType == "hair":
+            catalog.append(makeAsset(nid, "clothes", category="Hair", author="author%d" % (nid % 50), files=files))
+        else:
+            catalog.append(makeAsset(nid, assetType, author="author%d" % (nid % 50), files=files))
+    return catalog
+
+
+class _Parent():
+
+    def __init__(self, root):
+        self.root = root
+        self.assetsById = {}
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    return SyscallCounter(monkeypatch)
+
+
+def test_parsing_assets_makes_no_syscalls(counter, tmpdir):
+    catalog = makeCatalog(2000)
+    parent = _Parent(str(tmpdir))
+
+    counter.reset()
+    start = time.time()
+    for asset in catalog:
+        remoteasset.RemoteAsset(parent, asset, parent)
+    elapsed = time.time() - start
+
+    print("\nParsed %d assets in %.3f s with %d file system calls %s" % (len(catalog), elapsed, counter.count, counter.byName))
+    assert counter.count == 0
+
+
+@pytest.mark.parametrize("fromSnapshot", [False, True])
+def test_startup_syscalls_do_not_grow_with_catalog(counter, catalogRoot, fromSnapshot):
+    counts = {}
+    for size in [200, 2000]:
+        writeCatalog(catalogRoot, makeCatalog(size))
+        for fn in ["remote.snapshot", "assets.sqlite"]:
+            if os.path.exists(os.path.join(catalogRoot, fn)):
+                os.remove(os.path.join(catalogRoot, fn))
+        if fromSnapshot:
+            db = assetdb.AssetDB(None)
+            db.close()
+
+        counter.reset()
+        start = time.time()
+        db = assetdb.AssetDB(None)
+        elapsed = time.time() - start
+        counts[size] = counter.count
+
+        print("\nStartup with %d assets %s: %.3f s, %d file system calls %s" % (size, "from snapshot" if fromSnapshot else "from json", elapsed, counter.count, counter.byName))
+        assert len(db.assetsById) == size
+        db.close()
+
+    assert counts[2000] == counts[200]
@@ -0,0 +1,50 @@
+"""
+Ranking of the full text index used for searching asset titles and descriptions.
+"""
+
+from conftest import importPlugin
+
+textindex = importPlugin("textindex")
+
+
+def makeIndex(documents):
+    index = textindex.TextIndex()
+    for docId in documents:
+        index.addDocument(docId, documents[docId])
+    index.finish()
+    return index
+
+
+def rank(index, query):
+    scores = index.search(query)
+    return sorted(scores.keys(), key=lambda docId: (-scores[docId], docId))
+
+
+def test_whole_word_ranks_above_longer_word_containing_it():
+    # The longer word is rarer than the term, which must not make the partial match win
+    index = makeIndex({
+        1: "Dresser", 2: "Red Dress", 3: "Blue Dress", 4: "Long Dress",
+        5: "Red Shirt", 6: "Blue Shirt", 7: "Green Shirt", 8: "Jeans", 9: "Boots", 10: "Hat"
+    })
+    assert rank(index, "dress")[-1] == 1
+
+
+def test_whole_word_ranks_above_partial_match_in_same_length_title():
+    index = makeIndex({ 1: "Summer Dresses", 2: "Summer Dress", 3: "Winter Coat" })
+    assert rank(index, "dress") == [2, 1]
+
+
+def test_all_terms_must_match():
+    index = makeIndex({ 1: "Red Dress", 2: "Red Shirt", 3: "Blue Dress" })
+    assert rank(index, "red dress") == [1]
+    assert rank(index, "red dre") == [1]
+
+
+def test_candidates_limit_the_result():
+    index = makeIndex({ 1: "Red Dress", 2: "Blue Dress", 3: "Dress" })
+    assert set(index.search("dress", candidates=set([1, 2])).keys()) == set([1, 2])
+
+
+def test_query_without_terms():
+    index = makeIndex({ 1: "Red Dress" })
+    assert index.search("  -- ") is None
@@ -0,0 +1,54 @@
+"""
+Order in which the thumbnail queue fetches thumbnails, and which requests it drops.
+"""
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from conftest import importPlugin
+
+thumbnailqueue = importPlugin("thumbnailqueue")
+
+
+class _Asset():
+
+    def __init__(self, assetId):
+        self.assetId = assetId
+        self.remoteFiles = { "thumb": "http://example.com/%d/thumb.png" % assetId }
+
+    def getId(self):
+        return self.assetId
+
+    def getThumbPath(self):
+        return "/nonexistent/%d/thumb.png" % self.assetId
+
+
+def _push(queue, assetId, priority):
+    with queue._condition:
+        queue._push(_Asset(assetId), priority)
+
+
+def _popIds(queue, count):
+    return [queue._pop()[3] for i in range(count)]
+
+
+def test_visible_thumbnails_come_after_now_and_before_the_listing():
+    queue = thumbnailqueue.ThumbnailQueue()
+    _push(queue, 1, 0)
+    _push(queue, 2, thumbnailqueue.PRIORITY_VISIBLE)
+    _push(queue, 3, thumbnailqueue.PRIORITY_NOW)
+
+    assert _popIds(queue, 3) == [3, 2, 1]
+
+
+def test_cancel_drops_visible_but_keeps_now():
+    queue = thumbnailqueue.ThumbnailQueue()
+    _push(queue, 1, 0)
+    _push(queue, 2, thumbnailqueue.PRIORITY_VISIBLE)
+    _push(queue, 3, thumbnailqueue.PRIORITY_NOW)
+
+    queue.cancel()
+    _push(queue, 4, 0)
+
+    assert _popIds(queue, 2) == [3, 4]